@@ -1,15 +1,14 @@
 import streamlit as st
 import uuid
-import datetime
-import json
-import os
-import concurrent.futures
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 
 # Import backend modules
 from backend.agents.listener import ListenerAgent
 from backend.agents.mapper import ClinicalMapperAgent
+from backend.utils.executors import PoolSaturated, get_executor
+from backend.utils.mapper_cache import MapperCache
 from backend.utils.matchmaker import PeerMatchmaker
+from backend.utils.session_log import LOG_WRITER, allocate_session_log
 
 # --- UI Customization ---
 st.set_page_config(page_title="Kalpana - Peer Support", page_icon="🌿", layout="centered")
@@ -56,7 +55,7 @@ def inject_custom_css():
 # --- Initialization ---
 @st.cache_resource
 def load_agents():
-    return ListenerAgent(), ClinicalMapperAgent(), PeerMatchmaker()
+    return ListenerAgent(), ClinicalMapperAgent(cache=MapperCache()), PeerMatchmaker()
 
 def init_session():
     if "session_id" not in st.session_state:
@@ -69,15 +68,12 @@ def init_session():
         st.session_state.context_summary = ""
         st.session_state.session_root_cause = "-"
         st.session_state.session_risk_score = 1
+        st.session_state.match_cache = {}
+        st.session_state.last_profile = None
         
         # Logging setup
-        os.makedirs("session_logs", exist_ok=True)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        st.session_state.log_file = f"session_logs/session_{st.session_state.session_id}_{timestamp}.json"
-        
-        with open(st.session_state.log_file, "w") as f:
-            json.dump([], f)
-            
+        st.session_state.log_file = allocate_session_log("session_logs")
+
         # Greeting
         greeting = "Hi there. I'm Kalpana. I'm here to listen and support you. What's on your mind today?"
         st.session_state.messages.append({"role": "assistant", "content": greeting})
@@ -121,20 +117,35 @@ def main():
 
         # Process Listener and Mapper concurrently
         with st.chat_message("assistant"):
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                # Submit mapper task first
-                future_mapper = executor.submit(mapper_agent.analyze, full_context_str)
-                
-                # Stream the listener response
-                stream = listener_agent.generate_stream(
-                    langchain_history, 
-                    st.session_state.current_phase, 
-                    st.session_state.context_summary
-                )
-                full_listener_response = st.write_stream(stream)
-                
-                # Wait for mapper profile (if it's not done yet, this will block slightly)
+            # Submit mapper task first, on the process-wide mapper pool
+            try:
+                future_mapper = get_executor("mapper").submit(mapper_agent.analyze, full_context_str)
+            except PoolSaturated as e:
+                print(f"[APP WARN] {e} Reusing the previous clinical profile for this turn.")
+                future_mapper = None
+
+            # Stream the listener response
+            stream = listener_agent.generate_stream(
+                langchain_history, 
+                st.session_state.current_phase, 
+                st.session_state.context_summary
+            )
+            full_listener_response = st.write_stream(stream)
+
+            # Wait for mapper profile (if it's not done yet, this will block slightly)
+            if future_mapper is not None:
                 profile = future_mapper.result()
+                st.session_state.last_profile = dict(profile)
+            else:
+                profile = dict(st.session_state.last_profile or {
+                    "clinical_summary": st.session_state.context_summary,
+                    "primary_emotion": "unknown",
+                    "detected_risk": "low",
+                    "self_harm_indicators": False,
+                    "risk_score": 1,
+                    "root_cause_of_the_distress": st.session_state.session_root_cause,
+                })
+                profile["degraded"] = True
 
         st.session_state.messages.append({"role": "assistant", "content": full_listener_response})
 
@@ -189,7 +200,7 @@ def main():
         peer_group = None
         # We require at least 4 items in raw_history (including the 2 being added this turn)
         if st.session_state.session_root_cause != "-" and current_risk_score >= 5 and (len(st.session_state.raw_history) + 2) >= 4:
-            match = matchmaker.find_match(st.session_state.session_root_cause)
+            match = matchmaker.find_match_cached(st.session_state.session_root_cause, st.session_state.match_cache)
             if match:
                 peer_id = match.get("peer_id", "Unknown Peer")
                 st.success(f"**Peer Match Found:** I've found someone who has gone through something similar. Talking to them might help you feel better. ([{peer_id}])")
@@ -206,14 +217,7 @@ def main():
             "peer_group_match": peer_group,
             "clinical_profile": profile
         }
-        
-        with open(st.session_state.log_file, "r") as f:
-            logs = json.load(f)
-            
-        logs.append(log_entry)
-        
-        with open(st.session_state.log_file, "w") as f:
-            json.dump(logs, f, indent=4)
+        LOG_WRITER.append(st.session_state.log_file, log_entry)
 
         # Append to raw_history
         st.session_state.raw_history.append({"role": "user", "content": user_input})
@@ -0,0 +1,125 @@
+# backend/agents/json_stream.py
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Parses a top-level JSON object that arrives in chunks and reports each member as soon as its
+    value is complete: strings at their closing quote, containers at their closing bracket, and
+    numbers/booleans/null at the following ',' or '}'. Text before the opening '{' is skipped.
+    A malformed stream sets error and stops reporting instead of raising.
+    """
+
+    def __init__(self):
+        self.fields: dict = {}
+        self.done = False
+        self.error = None
+        self._state = "start"
+        self._buf = []
+        self._key = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text: str) -> list:
+        """
+        Consumes the next chunk and returns the (key, value) pairs it completed, in order.
+        """
+        completed = []
+        if self.done or self.error:
+            return completed
+        for ch in text:
+            try:
+                self._step(ch, completed)
+            except ValueError as e:
+                self.error = e
+                break
+            if self.done:
+                break
+        return completed
+
+    def _emit(self, completed: list):
+        value = json.loads("".join(self._buf).strip())
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        self._buf = []
+
+    def _step(self, ch: str, completed: list):
+        state = self._state
+        if state == "start":
+            if ch == "{":
+                self._state = "before_key"
+        elif state == "before_key":
+            if ch == '"':
+                self._state = "key"
+                self._buf = []
+                self._escaped = False
+            elif ch == "}":
+                self.done = True
+            elif not (ch.isspace() or ch == ","):
+                raise ValueError(f"Expected a key, got {ch!r}")
+        elif state == "key":
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._key = json.loads('"' + "".join(self._buf) + '"')
+                self._state = "colon"
+                return
+            self._buf.append(ch)
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value"
+                self._buf = []
+                self._depth = 0
+                self._in_string = False
+                self._escaped = False
+            elif not ch.isspace():
+                raise ValueError(f"Expected ':', got {ch!r}")
+        elif state == "value":
+            self._step_value(ch, completed)
+        elif state == "after_value":
+            if ch == ",":
+                self._state = "before_key"
+            elif ch == "}":
+                self.done = True
+            elif not ch.isspace():
+                raise ValueError(f"Expected ',' or '}}', got {ch!r}")
+
+    def _step_value(self, ch: str, completed: list):
+        if self._in_string:
+            self._buf.append(ch)
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    self._emit(completed)
+                    self._state = "after_value"
+            return
+
+        if ch == '"':
+            self._in_string = True
+            self._buf.append(ch)
+        elif ch in "{[":
+            self._depth += 1
+            self._buf.append(ch)
+        elif ch in "}]":
+            if self._depth == 0:
+                # End of the enclosing object right after a scalar
+                self._emit(completed)
+                self.done = True
+                return
+            self._depth -= 1
+            self._buf.append(ch)
+            if self._depth == 0:
+                self._emit(completed)
+                self._state = "after_value"
+        elif ch == "," and self._depth == 0:
+            self._emit(completed)
+            self._state = "before_key"
+        else:
+            self._buf.append(ch)
@@ -1,20 +1,104 @@
 # backend/agents/listener.py
+import asyncio
+import bisect
+import os
+import random
+import threading
 from langchain_community.chat_models import ChatOllama
 from langchain_core.messages import SystemMessage
 
+from .prompt_packer import PromptPacker
+
+# Ollama server the agents talk to (e.g. a fake server for load tests)
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+# Prompt budget (system prompt + history) and per-message cap, in tokens
+LISTENER_PROMPT_TOKENS = int(os.getenv("LISTENER_PROMPT_TOKENS", "1024"))
+LISTENER_MESSAGE_TOKENS = int(os.getenv("LISTENER_MESSAGE_TOKENS", "384"))
+
+# Share of capped replies that keep generating in the background, unseen, to measure how many
+# tokens the sentence cap saves. That generation runs after the reply's model slot is released,
+# so keep the rate low; 0 turns the estimate off
+LISTENER_OVERRUN_SAMPLE_RATE = float(os.getenv("LISTENER_OVERRUN_SAMPLE_RATE", "0.05"))
+# Reply length buckets in tokens (Ollama streams one token per chunk)
+REPLY_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024)
+
+# Complete sentences allowed per phase before generation is cut off
+PHASE_SENTENCE_LIMITS = {"greeting": 3, "explore": 4, "probe": 4, "process": 4, "crisis": 4}
+# Latin, ellipsis, Devanagari danda / double danda, Urdu full stop and question mark
+SENTENCE_TERMINATORS = set(".!?…\u0964\u0965\u06d4\u061f")
+_CLOSERS = set("\"'”’)]")
+_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e"}
+
+
+class SentenceBudget:
+    """
+    Counts complete sentences in a streamed reply across chunk boundaries. A sentence ends at a
+    terminator followed by whitespace, so decimals ("3.5") and most abbreviations don't count.
+    feed() returns the part of the chunk inside the budget and whether the budget is used up.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.sentences = 0
+        self._after_terminator = False
+        self._word = ""
+
+    def feed(self, text: str) -> tuple:
+        for index, ch in enumerate(text):
+            if self._after_terminator:
+                if ch.isspace():
+                    self._after_terminator = False
+                    if self._word.rstrip("".join(SENTENCE_TERMINATORS)).lower() not in _ABBREVIATIONS:
+                        self.sentences += 1
+                        if self.sentences >= self.limit:
+                            return text[:index], True
+                elif ch in SENTENCE_TERMINATORS or ch in _CLOSERS:
+                    continue
+                else:
+                    self._after_terminator = False
+            if ch.isspace():
+                self._word = ""
+            else:
+                self._word += ch
+                if ch in SENTENCE_TERMINATORS:
+                    self._after_terminator = True
+        return text, False
+
 class ListenerAgent:
     def __init__(self):
+        self.num_predict = 1024
+        self.model_name = "ministral-3:3b"
         self.llm = ChatOllama(
-            model="ministral-3:3b", 
+            model=self.model_name,
+            base_url=OLLAMA_BASE_URL,
             temperature=0.3, # Lower temperature for more consistent, grounded output
             num_gpu=0,  
             keep_alive=-1,
             num_ctx=4096,
             num_thread=8,
-            num_predict=1024,
+            num_predict=self.num_predict,
             repeat_penalty=1.2,
             stop=["\n\n", "User:", "You:", "Name: Response"]
         )
+        self._budget_lock = threading.Lock()
+        self.budget_stats = {
+            "replies": 0,
+            "stopped_early": 0,
+            "tokens_streamed": 0,
+            # Capped replies only: tokens generated at the cut, and the num_predict each could have used
+            "tokens_at_cut": 0,
+            "num_predict_at_cut": 0,
+            # Tokens a sample of capped replies went on to generate once nobody was reading them
+            "overrun_samples": 0,
+            "overrun_tokens_sampled": 0,
+        }
+        # Reply lengths for capped and naturally finished replies, one count per bucket (+ overflow)
+        self._reply_tokens = {"capped": [0] * (len(REPLY_TOKEN_BUCKETS) + 1),
+                              "natural": [0] * (len(REPLY_TOKEN_BUCKETS) + 1)}
+        self._overrun_tasks = set()
+        # Never let the prompt eat into the room num_predict needs within num_ctx
+        self.packer = PromptPacker("listener", min(LISTENER_PROMPT_TOKENS, 4096 - self.num_predict),
+                                   LISTENER_MESSAGE_TOKENS, model=self.model_name)
         # Base persona is constant; phase instructions are selected at call time
         self.base_persona = (
             "You are a calm, grounded psychotherapist. Use plain, simple language, strictly no overly poetic or metaphorical language. "
@@ -28,14 +112,114 @@ class ListenerAgent:
             "crisis":  "The user may be in crisis. Do NOT probe. Be gentle and grounding. Let them know they are heard and safe.",
         }
 
-    def generate_stream(self, history: list, phase: str = "explore", context_summary: str = ""):
+    def _build_prompt(self, history: list, phase: str, context_summary: str) -> list:
         # Build the system prompt dynamically based on the current phase
         instruction = self.phase_instructions.get(phase, self.phase_instructions["explore"])
 
         # Inject clinical_summary as a compact memory anchor (if available)
         memory_note = f" [Session context: {context_summary}]" if context_summary else ""
 
+        # Persona first and the per-turn parts last, so consecutive prompts share the longest prefix
         system_prompt = SystemMessage(content=self.base_persona + " " + instruction + memory_note)
-        prompt = [system_prompt] + history[-8:]
-        for chunk in self.llm.stream(prompt):
-            yield chunk.content
\ No newline at end of file
+        return self.packer.pack_messages(system_prompt, history)
+
+    def _record_budget(self, tokens: int, stopped: bool, num_predict: int):
+        with self._budget_lock:
+            self.budget_stats["replies"] += 1
+            self.budget_stats["tokens_streamed"] += tokens
+            if stopped:
+                self.budget_stats["stopped_early"] += 1
+                self.budget_stats["tokens_at_cut"] += tokens
+                self.budget_stats["num_predict_at_cut"] += num_predict
+            self._reply_tokens["capped" if stopped else "natural"][bisect.bisect_left(REPLY_TOKEN_BUCKETS, tokens)] += 1
+
+    async def _measure_overrun(self, stream):
+        """
+        Lets a capped reply run to its natural end (or num_predict) and records what it added.
+        """
+        tokens = 0
+        try:
+            async for _ in stream:
+                tokens += 1
+        except Exception as e:
+            # A sample that did not finish would understate the overrun; leave it out
+            print(f"[LISTENER WARN]: Overrun sample failed: {e}")
+            return
+        finally:
+            await stream.aclose()
+        with self._budget_lock:
+            self.budget_stats["overrun_samples"] += 1
+            self.budget_stats["overrun_tokens_sampled"] += tokens
+
+    def stats(self) -> dict:
+        with self._budget_lock:
+            stats = dict(self.budget_stats)
+            histograms = {kind: list(counts) for kind, counts in self._reply_tokens.items()}
+        # Saved tokens, at most (every cut reply would have run to num_predict) and as estimated
+        # from the sampled overruns of capped replies
+        stats["tokens_saved_upper_bound"] = stats["num_predict_at_cut"] - stats["tokens_at_cut"]
+        stats["tokens_saved_estimate"] = (
+            round(stats["stopped_early"] * stats["overrun_tokens_sampled"] / stats["overrun_samples"])
+            if stats["overrun_samples"] else None
+        )
+        stats["reply_tokens"] = {}
+        for kind, counts in histograms.items():
+            cumulative, buckets = 0, {}
+            for bound, count in zip(REPLY_TOKEN_BUCKETS, counts):
+                cumulative += count
+                buckets[f"le_{bound}"] = cumulative
+            buckets["le_inf"] = cumulative + counts[-1]
+            stats["reply_tokens"][kind] = buckets
+        return stats
+
+    def _stream_kwargs(self, num_predict: int | None) -> dict:
+        # A tighter per-call generation cap (e.g. under load) overrides the model option
+        return {"num_predict": num_predict} if num_predict else {}
+
+    def generate_stream(self, history: list, phase: str = "explore", context_summary: str = "",
+                        num_predict: int | None = None):
+        prompt = self._build_prompt(history, phase, context_summary)
+        budget = SentenceBudget(PHASE_SENTENCE_LIMITS.get(phase, 4))
+        chunks, stopped = 0, False
+        stream = self.llm.stream(prompt, **self._stream_kwargs(num_predict))
+        try:
+            for chunk in stream:
+                chunks += 1
+                text, stopped = budget.feed(chunk.content)
+                if text:
+                    yield text
+                if stopped:
+                    break
+        finally:
+            # Closing the stream drops the Ollama request, which stops generation
+            stream.close()
+            self._record_budget(chunks, stopped, num_predict or self.num_predict)
+
+    async def agenerate_stream(self, history: list, phase: str = "explore", context_summary: str = "",
+                               num_predict: int | None = None):
+        """
+        Async twin of generate_stream: streams from Ollama on the event loop instead of a thread.
+        """
+        prompt = self._build_prompt(history, phase, context_summary)
+        budget = SentenceBudget(PHASE_SENTENCE_LIMITS.get(phase, 4))
+        chunks, stopped, sampled = 0, False, False
+        stream = self.llm.astream(prompt, **self._stream_kwargs(num_predict))
+        try:
+            async for chunk in stream:
+                chunks += 1
+                text, stopped = budget.feed(chunk.content)
+                if text:
+                    yield text
+                if stopped:
+                    sampled = random.random() < LISTENER_OVERRUN_SAMPLE_RATE
+                    break
+        finally:
+            if sampled:
+                # The reply is complete for the caller; the rest of the generation is only counted
+                task = asyncio.create_task(self._measure_overrun(stream))
+                self._overrun_tasks.add(task)
+                task.add_done_callback(self._overrun_tasks.discard)
+            else:
+                # Closing the stream drops the Ollama request, which stops generation
+                await stream.aclose()
+            self._record_budget(chunks, stopped, num_predict or self.num_predict)
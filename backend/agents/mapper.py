@@ -1,14 +1,42 @@
 # backend/agents/mapper.py
 import json
+import logging
+import os
 import re
+from contextlib import aclosing
 from langchain_community.chat_models import ChatOllama
 from langchain_core.messages import SystemMessage, HumanMessage
 
+from .json_stream import IncrementalJSONParser
+from .listener import OLLAMA_BASE_URL
+from .prompt_packer import PromptPacker
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the system prompt or output schema changes
+PROMPT_VERSION = "2"
+# Prompt budget (system prompt + transcript) and per-line cap, in tokens
+MAPPER_PROMPT_TOKENS = int(os.getenv("MAPPER_PROMPT_TOKENS", "2048"))
+MAPPER_LINE_TOKENS = int(os.getenv("MAPPER_LINE_TOKENS", "512"))
+# Generation stops as soon as all of these have been parsed from the stream
+REQUIRED_FIELDS = (
+    "self_harm_indicators",
+    "risk_score",
+    "detected_risk",
+    "primary_emotion",
+    "root_cause_of_the_distress",
+    "clinical_summary",
+)
+
 
 class ClinicalMapperAgent:
-    def __init__(self):
+    def __init__(self, cache=None):
+        # Optional MapperCache (utils/mapper_cache.py); failed analyses are never cached
+        self.cache = cache
+        self.model_name = "gemma3:4b"
         self.llm = ChatOllama(
-            model="gemma3:4b", 
+            model=self.model_name,
+            base_url=OLLAMA_BASE_URL,
             temperature=0.0,
             num_gpu=-1,  
             keep_alive=-1,
@@ -17,57 +45,146 @@ class ClinicalMapperAgent:
             num_predict=1024,
             format="json"
         )
+        self.packer = PromptPacker("mapper", min(MAPPER_PROMPT_TOKENS, 8192 - 1024), MAPPER_LINE_TOKENS,
+                                   model=self.model_name)
 
-    def analyze(self, user_message: str) -> dict:
+    def _messages(self, user_message: str) -> list:
         system_prompt_template = """You are an expert Clinical Psychologist AI mapping a user's trauma.
         Read the provided conversation transcript and analyze the user's current psychological state.
         
         CRITICAL RULES:
-        1. clinical_summary: Summarize the user's situation in 2-3 sentences. Explicitly justify the chosen emotion, risk level, and root cause.
-        2. primary_emotion: e.g., severe anxiety, suicidal ideation, depression, fear.
+        1. self_harm_indicators: boolean (true/false).
+        2. risk_score: Integer 1-10.
         3. detected_risk: "low" (1-4), "moderate" (5-7), or "high" (8-10).
-        4. self_harm_indicators: boolean (true/false).
-        5. risk_score: Integer 1-10.
-        6. root_cause_of_the_distress: Identify the specific, external life-event or legitimate incident that is the root cause of the distress. Examples include: 'Bereavement/Loss', 'Job loss/Layoffs', 'Academic failure/Exam stress', 'Physical assault', 'War/Conflict', 'Breakup/Divorce'. CRITICAL: If the user only describes feelings (lonely, sad, anxious) without naming a specific external event, YOU MUST RETURN '-'
+        4. primary_emotion: e.g., severe anxiety, suicidal ideation, depression, fear.
+        5. root_cause_of_the_distress: Identify the specific, external life-event or legitimate incident that is the root cause of the distress. Examples include: 'Bereavement/Loss', 'Job loss/Layoffs', 'Academic failure/Exam stress', 'Physical assault', 'War/Conflict', 'Breakup/Divorce'. CRITICAL: If the user only describes feelings (lonely, sad, anxious) without naming a specific external event, YOU MUST RETURN '-'
+        6. clinical_summary: Summarize the user's situation in 2-3 sentences. Explicitly justify the chosen emotion, risk level, and root cause.
         
-        Output ONLY valid JSON matching this exact structure:
+        Output ONLY valid JSON with the keys in exactly this order:
         {
-            "clinical_summary": "string",
-            "primary_emotion": "string",
-            "detected_risk": "low",
             "self_harm_indicators": false,
             "risk_score": 1,
-            "root_cause_of_the_distress": "string"
+            "detected_risk": "low",
+            "primary_emotion": "string",
+            "root_cause_of_the_distress": "string",
+            "clinical_summary": "string"
         }"""
 
-        messages = [
+        # Transcript lines are kept newest-first within the budget; the system prompt is never cut
+        prefix_tokens = self.packer.count(system_prompt_template)
+        transcript = "\n".join(self.packer.pack_texts(user_message.splitlines() or [""], prefix_tokens))
+
+        return [
             SystemMessage(content=system_prompt_template), 
-            HumanMessage(content=user_message)
+            HumanMessage(content=transcript)
         ]
-        try:
-            analysis = self.llm.invoke(messages)
-            raw_text = analysis.content.strip()
-            print(f"[DEBUG RAW MAPPER OUTPUT]: '{raw_text}'")  # Temporary debug print
+
+    def _parse(self, raw_text: str) -> dict:
+        match = re.search(r'\{.*\}', raw_text, re.DOTALL)
+        if match:
+            parsed = json.loads(match.group(0))
+            # Defend against empty {} or missing critical fields
+            if not parsed.get("clinical_summary"):
+                raise ValueError("Empty or incomplete JSON received")
+            return parsed
             
-            match = re.search(r'\{.*\}', raw_text, re.DOTALL)
-            if match:
-                parsed = json.loads(match.group(0))
-                # Defend against empty {} or missing critical fields
-                if not parsed.get("clinical_summary"):
-                    raise ValueError("Empty or incomplete JSON received")
-                return parsed
-                
-            parsed_raw = json.loads(raw_text)
-            if not parsed_raw.get("clinical_summary"):
+        parsed_raw = json.loads(raw_text)
+        if not parsed_raw.get("clinical_summary"):
+            raise ValueError("Empty or incomplete JSON received")
+        return parsed_raw
+
+    def _fallback(self, error: Exception) -> dict:
+        print(f"[MAPPER ERROR] JSON Parsing failed: {error}")
+        return {
+            "clinical_summary": "Parsing failed or format error.",
+            "primary_emotion": "unknown",
+            "detected_risk": "low", 
+            "self_harm_indicators": False, 
+            "risk_score": 1,
+            "root_cause_of_the_distress": "-"
+        }
+
+    def _feed(self, parser: IncrementalJSONParser, text: str, on_field) -> bool:
+        # Publishes newly completed fields; True once every required field is in
+        for key, value in parser.feed(text):
+            if on_field:
+                on_field(key, value)
+        return all(field in parser.fields for field in REQUIRED_FIELDS)
+
+    def _result(self, parser: IncrementalJSONParser, raw_text: str) -> dict:
+        # Raw output holds clinical details; only logged when debug logging is switched on
+        logger.debug("Raw mapper output: %r", raw_text.strip())
+        if all(field in parser.fields for field in REQUIRED_FIELDS):
+            parsed = dict(parser.fields)
+            if not parsed.get("clinical_summary"):
                 raise ValueError("Empty or incomplete JSON received")
-            return parsed_raw
+            return parsed
+        # The stream ended without every field (or could not be parsed incrementally)
+        return self._parse(raw_text.strip())
+
+    def _cached(self, user_message: str, on_field, lookup: bool = True) -> tuple:
+        # Returns (cache key, cached profile or None); a hit replays its fields to on_field
+        if self.cache is None:
+            return None, None
+        key = self.cache.key(user_message, self.model_name, PROMPT_VERSION)
+        profile = self.cache.get(key) if lookup else None
+        if profile is not None and on_field:
+            for field, value in profile.items():
+                on_field(field, value)
+        return key, profile
+
+    def cached(self, user_message: str, on_field=None) -> dict | None:
+        """
+        The cached profile for user_message (fields replayed to on_field), or None. No model call,
+        so callers can skip queueing for the model on a hit.
+        """
+        return self._cached(user_message, on_field)[1]
+
+    def analyze(self, user_message: str, on_field=None) -> dict:
+        """
+        Streams the profile and stops generation once every required field has been parsed.
+        on_field(key, value) is called as each field completes, safety fields first.
+        """
+        key, cached = self._cached(user_message, on_field)
+        if cached is not None:
+            return cached
+        parser = IncrementalJSONParser()
+        raw_text = ""
+        try:
+            stream = self.llm.stream(self._messages(user_message))
+            try:
+                for chunk in stream:
+                    raw_text += chunk.content
+                    if self._feed(parser, chunk.content, on_field):
+                        break
+            finally:
+                stream.close()
+            profile = self._result(parser, raw_text)
+            if key:
+                self.cache.put(key, profile)
+            return profile
+        except Exception as e:
+            return self._fallback(e)
+
+    async def aanalyze(self, user_message: str, on_field=None, check_cache: bool = True) -> dict:
+        """
+        Async twin of analyze, so the mapper can run as a task on the API's event loop.
+        check_cache=False skips the lookup for callers that already missed in cached().
+        """
+        key, cached = self._cached(user_message, on_field, lookup=check_cache)
+        if cached is not None:
+            return cached
+        parser = IncrementalJSONParser()
+        raw_text = ""
+        try:
+            async with aclosing(self.llm.astream(self._messages(user_message))) as stream:
+                async for chunk in stream:
+                    raw_text += chunk.content
+                    if self._feed(parser, chunk.content, on_field):
+                        break
+            profile = self._result(parser, raw_text)
+            if key:
+                self.cache.put(key, profile)
+            return profile
         except Exception as e:
-            print(f"[MAPPER ERROR] JSON Parsing failed: {e}")
-            return {
-                "clinical_summary": "Parsing failed or format error.",
-                "primary_emotion": "unknown",
-                "detected_risk": "low", 
-                "self_harm_indicators": False, 
-                "risk_score": 1,
-                "root_cause_of_the_distress": "-"
-            }
+            return self._fallback(e)
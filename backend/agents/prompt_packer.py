@@ -0,0 +1,173 @@
+# backend/agents/prompt_packer.py
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+
+# Local tokenizer.json files, one per model (<model name with ":" and "/" as "_">.json); fetch
+# them once with backend/scripts/fetch_tokenizers.py. Missing files fall back to an estimate
+PROMPT_TOKENIZER_DIR = os.getenv(
+    "PROMPT_TOKENIZER_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "tokenizers"),
+)
+PROMPT_TOKEN_CACHE_SIZE = int(os.getenv("PROMPT_TOKEN_CACHE_SIZE", "4096"))
+# Chat-template tokens (role markers, separators) charged per message
+MESSAGE_OVERHEAD_TOKENS = 4
+# An older message is only kept truncated if at least this much budget is left for it
+MIN_TRUNCATED_TOKENS = 32
+TRUNCATION_MARKER = " … "
+
+_tokenizers = {}
+_tokenizer_lock = threading.Lock()
+
+
+def tokenizer_path(model: str) -> str:
+    return os.path.join(PROMPT_TOKENIZER_DIR, model.replace(":", "_").replace("/", "_") + ".json")
+
+
+def load_tokenizer(model: str | None):
+    """
+    The model's tokenizer from its local file, loaded once; None if there is no usable file.
+    Never downloads anything.
+    """
+    if not model:
+        return None
+    with _tokenizer_lock:
+        if model not in _tokenizers:
+            path = tokenizer_path(model)
+            _tokenizers[model] = None
+            try:
+                from tokenizers import Tokenizer
+                _tokenizers[model] = Tokenizer.from_file(path)
+            except Exception as e:
+                print(f"[PROMPT PACKER WARN]: No tokenizer for '{model}' at {path}, "
+                      f"estimating tokens from characters: {e}")
+        return _tokenizers[model]
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for Latin text; Indic scripts split much finer
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5)
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    tokenizer = load_tokenizer(model)
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return estimate_tokens(text)
+
+
+class PromptPacker:
+    """
+    Fits a model's prompt into a token budget. The system prompt is kept whole as a stable
+    prefix; history is filled newest-first until the budget runs out, and a message that does
+    not fit is cut in the middle (head and tail kept), so the same input always packs the same.
+    Token counts are cached per message text.
+    """
+
+    def __init__(self, name: str, budget_tokens: int, max_message_tokens: int | None = None,
+                 model: str | None = None):
+        self.name = name
+        self.model = model
+        self.tokenizer = load_tokenizer(model)
+        self.budget_tokens = budget_tokens
+        self.max_message_tokens = max_message_tokens or budget_tokens
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"prompts": 0, "tokens_total": 0, "tokens_max": 0, "tokens_last": 0,
+                       "truncated_messages": 0, "dropped_messages": 0, "estimated_counts": 0}
+
+    def count(self, text: str) -> int:
+        key = hashlib.sha1(text.encode("utf-8")).digest()
+        with self._lock:
+            tokens = self._counts.get(key)
+            if tokens is not None:
+                self._counts.move_to_end(key)
+                return tokens
+        tokens = self._count_tokens(text)
+        with self._lock:
+            self._counts[key] = tokens
+            while len(self._counts) > PROMPT_TOKEN_CACHE_SIZE:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def _count_tokens(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        # Fallback only: the estimate can be well off for the model's real tokenizer
+        with self._lock:
+            self._stats["estimated_counts"] += 1
+        return estimate_tokens(text)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Longest head + marker + tail cut of text that fits max_tokens.
+        """
+        if self._count_tokens(text) <= max_tokens:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            keep = (low + high + 1) // 2
+            candidate = text[:keep - keep // 2] + TRUNCATION_MARKER + text[len(text) - keep // 2:]
+            if self._count_tokens(candidate) <= max_tokens:
+                low = keep
+            else:
+                high = keep - 1
+        return text[:low - low // 2] + TRUNCATION_MARKER + text[len(text) - low // 2:]
+
+    def pack_texts(self, texts: list, prefix_tokens: int = 0) -> list:
+        """
+        Newest-first fill of plain texts (oldest first in, oldest first out). The newest text
+        is always kept, truncated if it alone exceeds the budget.
+        """
+        remaining = self.budget_tokens - prefix_tokens
+        packed = []
+        truncated = 0
+        for index, text in enumerate(reversed(texts)):
+            tokens = self.count(text) + MESSAGE_OVERHEAD_TOKENS
+            limit = min(self.max_message_tokens, remaining) - MESSAGE_OVERHEAD_TOKENS
+            if tokens - MESSAGE_OVERHEAD_TOKENS > limit:
+                if index > 0 and limit < MIN_TRUNCATED_TOKENS:
+                    break
+                text = self.truncate(text, max(limit, 1))
+                tokens = self.count(text) + MESSAGE_OVERHEAD_TOKENS
+                truncated += 1
+            packed.append(text)
+            remaining -= tokens
+            if remaining <= MESSAGE_OVERHEAD_TOKENS:
+                break
+        packed.reverse()
+        self._record(self.budget_tokens - remaining, truncated, len(texts) - len(packed))
+        return packed
+
+    def pack_messages(self, system_message, history: list) -> list:
+        """
+        [system_message] + as much of history (LangChain messages) as fits the budget.
+        """
+        prefix_tokens = self.count(system_message.content) + MESSAGE_OVERHEAD_TOKENS
+        packed = self.pack_texts([message.content for message in history], prefix_tokens)
+        kept = history[len(history) - len(packed):] if packed else []
+        return [system_message] + [
+            message if message.content == text else message.__class__(content=text)
+            for message, text in zip(kept, packed)
+        ]
+
+    def _record(self, tokens: int, truncated: int, dropped: int):
+        with self._lock:
+            stats = self._stats
+            stats["prompts"] += 1
+            stats["tokens_total"] += tokens
+            stats["tokens_max"] = max(stats["tokens_max"], tokens)
+            stats["tokens_last"] = tokens
+            stats["truncated_messages"] += truncated
+            stats["dropped_messages"] += dropped
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["tokens_mean"] = stats["tokens_total"] / stats["prompts"] if stats["prompts"] else 0.0
+        stats["budget_tokens"] = self.budget_tokens
+        stats["tokenizer"] = tokenizer_path(self.model) if self.tokenizer is not None else "estimate"
+        return stats
@@ -1,48 +1,111 @@
 # backend/api.py
 import json
 import os
-import datetime
 import base64
-import concurrent.futures
+import hashlib
+import asyncio
+import time
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, File, Form, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage, AIMessage
 
-from agents.listener import ListenerAgent
+from agents.listener import SENTENCE_TERMINATORS, ListenerAgent
 from agents.mapper import ClinicalMapperAgent
-from utils.matchmaker import PeerMatchmaker
+from utils.executors import PoolSaturated, create_executors, get_executor, shutdown_executors
+from utils.appointment_store import AppointmentStore, SlotAlreadyBooked
+from utils.crisis_screen import CrisisScreen
+from utils.mapper_batcher import MapperBatcher
+from utils.mapper_cache import MapperCache
+from utils.mapper_cadence import mapper_decision, record_mapper_profile
+from utils.matchmaker import PEERS_FILE, PeerMatchmaker
+from utils.metrics import METRICS
+from utils.model_scheduler import PRIORITY_CRISIS, PRIORITY_HIGH_RISK, PRIORITY_ROUTINE, ModelScheduler
+from utils.overload import LEVEL_DEFER_MATCHING, LEVEL_SHED_MAPPER, OverloadController
+from utils.peer_directory import PeerDirectory
+from utils.session_store import SessionBusy, create_session_store
+from utils.session_log import LOG_WRITER, allocate_session_log
+from utils.turn_stream import TurnRegistry, TurnStream, parse_event_id
+from utils.stream_coalescer import SSE_COALESCE_BYTES, SSE_COALESCE_MS, coalesce_stream
 from utils.sarvam_api import transcribe_audio, translate_text, synthesize_speech
 
 # ---------------------------------------------------------------------------
 # Global State
 # ---------------------------------------------------------------------------
-ACTIVE_SESSIONS: dict = {}
+session_store = None
 listener_agent = None
 mapper_agent = None
 matchmaker = None
+peer_directory = None
+appointment_store = None
+crisis_screen = None
+mapper_batcher = None
+BACKGROUND_TASKS: set = set()
+# Recent chat turns, kept for SSE resume and duplicate-submission replay
+turn_registry = TurnRegistry()
+# Every Ollama call from a chat turn waits here for a slot of its model
+model_scheduler = ModelScheduler()
+# Sheds work from routine sessions when model queues or time to first token grow
+overload_controller = OverloadController(model_scheduler.queued)
 CRISIS_RISK_THRESHOLD = 8
+# Sessions at or above this risk score are queued ahead of routine ones
+HIGH_RISK_PRIORITY_SCORE = int(os.getenv("HIGH_RISK_PRIORITY_SCORE", "5"))
+# Sessions at or above this risk score keep full service while the server sheds load
+OVERLOAD_PROTECTED_RISK = int(os.getenv("OVERLOAD_PROTECTED_RISK", "7"))
 VOICE_LANGUAGE_CONFIDENCE_THRESHOLD = 0.70
 DEFAULT_VOICE_LANGUAGE = "en-IN"
+# Latency budget for a whole turn. If the mapper is still running once the listener is done and
+# the budget is spent, the turn completes on the previous profile and the late result is applied
+# to the session in the background.
+MAPPER_TURN_BUDGET_SECONDS = float(os.getenv("MAPPER_TURN_BUDGET_SECONDS", "15"))
+# Messages of server-side history kept per session for delta-mode chat requests
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "16"))
+# How often an idle SSE response checks whether the browser has gone away
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.25"))
+# Worker pools the API submits to; Mapper calls go through mapper_batcher on the event loop
+API_POOLS = ("matchmaker", "voice")
 
 # ---------------------------------------------------------------------------
 # Lifespan – Load heavy models once at startup
 # ---------------------------------------------------------------------------
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global listener_agent, mapper_agent, matchmaker
+    global listener_agent, mapper_agent, mapper_batcher, matchmaker, peer_directory, appointment_store, session_store, crisis_screen
+    print("[STARTUP] Creating worker pools...", flush=True)
+    create_executors(API_POOLS)
     print("[STARTUP] Loading Listener Agent...", flush=True)
     listener_agent = ListenerAgent()
     print("[STARTUP] Loading Mapper Agent...", flush=True)
-    mapper_agent = ClinicalMapperAgent()
+    mapper_agent = ClinicalMapperAgent(cache=MapperCache())
+    mapper_batcher = MapperBatcher(mapper_agent, model_scheduler)
+    print("[STARTUP] Compiling crisis pre-screen...", flush=True)
+    crisis_screen = CrisisScreen.from_file()
     print("[STARTUP] Connecting to Pinecone...", flush=True)
     matchmaker = PeerMatchmaker()
+    print("[STARTUP] Loading peer directory...", flush=True)
+    peer_directory = PeerDirectory(PEERS_FILE)
+    print("[STARTUP] Opening appointment store...", flush=True)
+    appointment_store = AppointmentStore(
+        os.path.join(PROJECT_ROOT, "data", "appointments.db"),
+        legacy_json_path=os.path.join(PROJECT_ROOT, "data", "appointments.json"),
+        slot_resolver=peer_directory.listed_slot,
+    )
+    print("[STARTUP] Opening session store...", flush=True)
+    session_store = create_session_store(os.path.join(PROJECT_ROOT, "data", "sessions.db"))
+    sweeper = asyncio.create_task(sweep_sessions_periodically())
     print("[STARTUP] All systems ready.", flush=True)
     yield
-    # Shutdown – nothing to clean up
+    sweeper.cancel()
+    turn_registry.cancel_all()
+    for task in list(BACKGROUND_TASKS):
+        task.cancel()
+    # Shutdown – finish in-flight pool work and write out any queued session log lines, waiting
+    # in worker threads so the event loop can still finish the tasks cancelled above
+    await asyncio.to_thread(shutdown_executors)
+    await asyncio.to_thread(LOG_WRITER.close)
 
 app = FastAPI(lifespan=lifespan)
 
@@ -63,7 +126,17 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     session_id: str
-    chat_history: list[ChatMessage]
+    # Either the full conversation (legacy mode, resets the server-side history) ...
+    chat_history: list[ChatMessage] = []
+    # ... or only the new user message plus its turn number (1-based, one per user turn)
+    message: str | None = None
+    turn_seq: int | None = None
+    # SSE batching of listener chunks; 0 ms sends every chunk as its own event
+    coalesce_ms: float | None = None
+    coalesce_bytes: int | None = None
+    # Resubmitting a turn with the same key replays it instead of generating it again
+    # (the Idempotency-Key header works too)
+    idempotency_key: str | None = None
 
 class ScheduleRequest(BaseModel):
     session_id: str
@@ -81,143 +154,434 @@ class TTSRequest(BaseModel):
 # ---------------------------------------------------------------------------
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+def new_session_state() -> dict:
+    return {
+        "current_phase": "explore",
+        "context_summary": "",
+        "session_root_cause": "-",
+        "session_risk_score": 1,
+        "preferred_voice_language": DEFAULT_VOICE_LANGUAGE,
+        "log_file": allocate_session_log(os.path.join(PROJECT_ROOT, "session_logs")),
+        "match_cache": {},
+        "last_profile": None,
+        "turn_count": 0,
+        "profile_turn": 0,
+        "risk_history": [],
+        "profile_terms": [],
+        "history": [],
+        "history_seq": 0,
+    }
+
 def get_or_create_session(session_id: str) -> dict:
-    if session_id not in ACTIVE_SESSIONS:
-        log_dir = os.path.join(PROJECT_ROOT, "session_logs")
-        os.makedirs(log_dir, exist_ok=True)
-        
-        # Generate sequential log filename like cli.py
-        existing_logs = [f for f in os.listdir(log_dir) if f.startswith("session_log") and f.endswith(".json")]
-        next_index = len(existing_logs) + 1
-        log_file = os.path.join(log_dir, f"session_log{next_index}.json")
-        
-        with open(log_file, "w") as f:
-            json.dump([], f)
-
-        ACTIVE_SESSIONS[session_id] = {
-            "current_phase": "explore",
-            "context_summary": "",
-            "session_root_cause": "-",
-            "session_risk_score": 1,
-            "preferred_voice_language": DEFAULT_VOICE_LANGUAGE,
-            "log_file": log_file,
-        }
-    return ACTIVE_SESSIONS[session_id]
+    return session_store.get_or_create(session_id, new_session_state)
+
+def turn_history(session: dict, req: ChatRequest) -> tuple:
+    """
+    The conversation up to and including this turn's user message, and this turn's sequence
+    number. A full chat_history replaces the server-side history; a delta request extends it.
+    """
+    if req.message is not None:
+        history = list(session.get("history") or [])
+        history.append({"role": "user", "content": req.message})
+        return history, req.turn_seq
+    history = [{"role": msg.role, "content": msg.content} for msg in req.chat_history]
+    return history[-HISTORY_MAX_MESSAGES:], sum(1 for msg in history if msg["role"] == "user")
+
+def expected_turn_seq(session: dict) -> int:
+    return session.get("history_seq", 0) + 1
+
+def resync_payload(session: dict) -> dict:
+    return {
+        "status": "resync",
+        "message": "Turn sequence does not match the server's history. Resend the full chat_history.",
+        "expected_turn_seq": expected_turn_seq(session),
+    }
+
+def degraded_profile(session: dict) -> dict:
+    """
+    Stand-in clinical profile for a turn the mapper did not analyze: the last real profile
+    (or a neutral one), flagged so the turn log shows it was not freshly computed.
+    """
+    profile = dict(session.get("last_profile") or {
+        "clinical_summary": session["context_summary"],
+        "primary_emotion": "unknown",
+        "detected_risk": "low",
+        "self_harm_indicators": False,
+        "risk_score": 1,
+        "root_cause_of_the_distress": session["session_root_cause"],
+    })
+    profile["degraded"] = True
+    return profile
+
+def is_crisis_signal(fields: dict) -> bool:
+    """
+    Crisis check on a possibly partial mapper profile, as fields stream in.
+    """
+    risk_score = fields.get("risk_score")
+    return fields.get("self_harm_indicators") is True or (
+        isinstance(risk_score, (int, float)) and not isinstance(risk_score, bool) and risk_score >= CRISIS_RISK_THRESHOLD
+    )
+
+def turn_priority(session: dict, prescreen_hit: bool) -> int:
+    """
+    Scheduling priority of a turn's model calls: crisis first, then high-risk sessions.
+    """
+    risk_score = session["session_risk_score"]
+    if prescreen_hit or session["current_phase"] == "crisis" or risk_score >= CRISIS_RISK_THRESHOLD:
+        return PRIORITY_CRISIS
+    if risk_score >= HIGH_RISK_PRIORITY_SCORE:
+        return PRIORITY_HIGH_RISK
+    return PRIORITY_ROUTINE
+
+def service_level(session: dict, priority: int) -> int:
+    """
+    Degradation level to apply to this turn; crisis and high-risk sessions always get level 0.
+    """
+    level = overload_controller.update()
+    if not level:
+        return 0
+    if priority == PRIORITY_CRISIS or session["session_risk_score"] >= OVERLOAD_PROTECTED_RISK:
+        METRICS.incr("overload.protected_turns")
+        return 0
+    METRICS.incr(f"overload.degraded_turns.level_{level}")
+    return level
+
+def crisis_event() -> str:
+    return f"data: {json.dumps({'type': 'metadata', 'peer_group_match': None, 'crisis_intercept': True})}\n\n"
+
+def apply_clinical_profile(session: dict, profile: dict, user_input: str) -> tuple:
+    """
+    Folds a mapper profile into the session state (mirrors app0.py / cli.py logic) and sets the
+    phase for the next turn. Returns (crisis_intercept, action, current_risk_score).
+    """
+    current_risk_score = profile.get("risk_score", 1)
+    self_harm = profile.get("self_harm_indicators", False)
+    crisis_intercept = bool(self_harm or current_risk_score >= CRISIS_RISK_THRESHOLD)
+
+    # Root cause state-locking
+    extracted_root_cause = profile.get("root_cause_of_the_distress", "-")
+    if extracted_root_cause != "-" and session["session_root_cause"] == "-":
+        session["session_root_cause"] = extracted_root_cause
+    elif session["session_root_cause"] != "-":
+        profile["root_cause_of_the_distress"] = session["session_root_cause"]
+
+    session["session_risk_score"] = max(session["session_risk_score"], current_risk_score)
+
+    # Action determination
+    if crisis_intercept:
+        action = "escalate_to_human"
+    elif session["session_root_cause"] != "-" and session["session_risk_score"] >= 5:
+        action = "route_to_peer_group"
+    else:
+        action = "continue_listening"
+
+    # Update context for next turn
+    session["context_summary"] = profile.get("clinical_summary", "")
+
+    # Phase derivation (priority candidates pattern)
+    candidates = []
+    if crisis_intercept:
+        candidates.append((0, "crisis"))
+    if session["session_root_cause"] != "-":
+        candidates.append((1, "process"))
+    if current_risk_score >= 5:
+        candidates.append((2, "probe"))
+    if len(user_input.split()) < 5 and current_risk_score == 1:
+        candidates.append((3, "greeting"))
+    candidates.append((4, "explore"))
+    session["current_phase"] = min(candidates, key=lambda x: x[0])[1]
+
+    return crisis_intercept, action, current_risk_score
+
+async def apply_late_profile(session_id: str, mapper_task: asyncio.Task, user_input: str, transcript: str,
+                             deadline: float, turn_number: int):
+    """
+    Applies a mapper result that missed its turn's budget once it arrives, unless a later turn
+    has already applied a fresher profile.
+    """
+    try:
+        profile = await mapper_task
+    except PoolSaturated:
+        return
+    lateness = time.monotonic() - deadline
+    METRICS.observe("mapper.lateness_seconds", lateness)
+
+    try:
+        async with session_store.alock(session_id):
+            session = await asyncio.to_thread(get_or_create_session, session_id)
+            if session.get("profile_turn", 0) > turn_number:
+                METRICS.incr("mapper.late_results_dropped")
+                print(f"[API] Dropping late mapper result for turn {turn_number}; a newer profile is already applied.")
+                return
+            session["last_profile"] = dict(profile)
+            record_mapper_profile(session, profile, transcript)
+            crisis_intercept, action, _ = apply_clinical_profile(session, profile, user_input)
+            session["profile_turn"] = turn_number
+            await LOG_WRITER.aappend(session["log_file"], {
+                "user_input": user_input,
+                "action": action,
+                "crisis_intercept": crisis_intercept,
+                "late_clinical_profile": profile,
+                "mapper_lateness_seconds": round(lateness, 3),
+            })
+            await asyncio.to_thread(session_store.save, session_id, session)
+    except SessionBusy:
+        METRICS.incr("mapper.late_results_dropped")
+        print(f"[API WARN] Session {session_id} stayed busy; dropping the late mapper result for turn {turn_number}.")
+
+def spawn_background(coro):
+    task = asyncio.create_task(coro)
+    BACKGROUND_TASKS.add(task)
+    task.add_done_callback(BACKGROUND_TASKS.discard)
+    return task
+
+def log_abandoned_turn(session: dict, user_input: str, partial_response: str, reason: str):
+    # Session state is deliberately left as it was before the turn; only the partial reply is recorded.
+    # The caller is unwinding a cancelled turn and cannot await, so the append is handed to a worker
+    # thread, which a later cancellation (e.g. at shutdown) cannot stop before it has written
+    asyncio.get_running_loop().run_in_executor(None, LOG_WRITER.append, session["log_file"], {
+        "user_input": user_input,
+        "assistant_response": partial_response,
+        "listener_phase": session["current_phase"],
+        "listener_context": session["context_summary"],
+        "action": "abandoned",
+        "partial": True,
+        "abandon_reason": reason,
+    })
+    METRICS.incr("chat.turns_abandoned")
+    print(f"[API] Turn abandoned ({reason}) after {len(partial_response)} characters.")
+
+async def sweep_sessions_periodically(interval: float = 60.0):
+    # Idle sessions also get evicted on access; this keeps memory flat when traffic stops
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(session_store.sweep)
+        turn_registry.sweep()
 
 # ---------------------------------------------------------------------------
 # SSE Streaming Endpoint
 # ---------------------------------------------------------------------------
+def turn_idempotency_key(req: ChatRequest, request: Request) -> str:
+    # Without an explicit key, a delta turn is identified by its sequence number and message and
+    # a legacy turn by its full history, so only a byte-identical resubmission attaches
+    key = request.headers.get("idempotency-key") or req.idempotency_key
+    if key:
+        return f"key:{key}"
+    if req.message is not None:
+        return f"seq:{req.turn_seq}:" + hashlib.sha256(req.message.encode("utf-8")).hexdigest()
+    history = json.dumps([[msg.role, msg.content] for msg in req.chat_history], ensure_ascii=False)
+    return "history:" + hashlib.sha256(history.encode("utf-8")).hexdigest()
+
+def turn_response(turn: TurnStream, after: int, request: Request) -> StreamingResponse:
+    return StreamingResponse(
+        turn.subscribe(after, request.is_disconnected, DISCONNECT_POLL_SECONDS),
+        media_type="text/event-stream",
+        headers={"X-Turn-Id": turn.turn_id},
+    )
+
 @app.post("/api/chat")
-async def chat(req: ChatRequest):
-    session = get_or_create_session(req.session_id)
-    user_input = req.chat_history[-1].content if req.chat_history else ""
-
-    # Build LangChain history for the Listener
-    langchain_history = []
-    for msg in req.chat_history:
-        if msg.role == "user":
-            langchain_history.append(HumanMessage(content=msg.content))
-        else:
-            langchain_history.append(AIMessage(content=msg.content))
-
-    # Build transcript for the Mapper (user messages only, last 3 turns)
-    # NOTE: We intentionally exclude long Kalpana responses — they eat the 4B model's
-    # input budget and are not clinically relevant for profiling the USER's state.
-    recent = req.chat_history[-6:]  # pull last 6, then filter
-    transcript_lines = []
-    for msg in recent:
-        if msg.role == "user":
-            transcript_lines.append(f"User: {msg.content}")
-    full_context_str = "\n".join(transcript_lines[-3:])  # cap at last 3 user turns
-
-    def generate():
-        # Fire the Mapper in a background thread
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_mapper = executor.submit(mapper_agent.analyze, full_context_str)
-
-            # Stream listener response word-by-word
-            full_response = ""
-            for chunk in listener_agent.generate_stream(
-                langchain_history,
-                session["current_phase"],
-                session["context_summary"],
-            ):
+async def chat(req: ChatRequest, request: Request):
+    # A reconnect carrying Last-Event-ID resumes its turn after the last event it saw
+    resume_id, resume_after = parse_event_id(request.headers.get("last-event-id"))
+    turn = turn_registry.get(resume_id) if resume_id else None
+    if turn is not None and turn.session_id == req.session_id:
+        METRICS.incr("sse.resume.resumed")
+        return turn_response(turn, resume_after, request)
+
+    # A duplicated submission attaches to the turn it duplicates, running or recently finished
+    key = turn_idempotency_key(req, request)
+    turn = turn_registry.find(req.session_id, key)
+    if turn is not None:
+        METRICS.incr("sse.resume.attached")
+        return turn_response(turn, 0, request)
+
+    if req.message is not None:
+        user_input = req.message
+        # Cheap early rejection; the check is repeated under the session lock before the turn runs
+        session = await asyncio.to_thread(get_or_create_session, req.session_id)
+        if req.turn_seq != expected_turn_seq(session):
+            METRICS.incr("chat.history_resyncs")
+            return JSONResponse(status_code=409, content=resync_payload(session))
+    else:
+        user_input = req.chat_history[-1].content if req.chat_history else ""
+
+    async def run_turn():
+        turn_started = time.monotonic()
+        session = await asyncio.to_thread(get_or_create_session, req.session_id)
+        if req.message is not None and req.turn_seq != expected_turn_seq(session):
+            METRICS.incr("chat.history_resyncs")
+            turn_registry.forget(req.session_id, key)
+            yield f"data: {json.dumps({'type': 'error', **resync_payload(session)})}\n\n"
+            return
+        turn_number = session.get("turn_count", 0) + 1
+        late_mapper_task = None
+
+        history, turn_seq = turn_history(session, req)
+
+        # Build LangChain history for the Listener
+        langchain_history = []
+        for msg in history:
+            if msg["role"] == "user":
+                langchain_history.append(HumanMessage(content=msg["content"]))
+            else:
+                langchain_history.append(AIMessage(content=msg["content"]))
+
+        # Build transcript for the Mapper (user messages only, last 3 turns)
+        # NOTE: We intentionally exclude long Kalpana responses — they eat the 4B model's
+        # input budget and are not clinically relevant for profiling the USER's state.
+        recent = history[-6:]  # pull last 6, then filter
+        transcript_lines = []
+        for msg in recent:
+            if msg["role"] == "user":
+                transcript_lines.append(f"User: {msg['content']}")
+        full_context_str = "\n".join(transcript_lines[-3:])  # cap at last 3 user turns
+
+        # Safety fields stream out of the Mapper first; a crisis is announced as soon as they are in
+        early_fields = {}
+        early_crisis = asyncio.Event()
+        crisis_announced = False
+
+        def on_mapper_field(key, value):
+            early_fields[key] = value
+            if not early_crisis.is_set() and is_crisis_signal(early_fields):
+                early_crisis.set()
+                METRICS.incr("mapper.early_crisis_signals")
+                METRICS.observe("mapper.crisis_signal_seconds", time.monotonic() - turn_started)
+
+        # Lexical pre-screen: a hit switches the listener to the crisis phase for this turn only;
+        # the Mapper still decides crisis routing
+        prescreen = crisis_screen.screen(user_input)
+        listener_phase = "crisis" if prescreen["crisis"] else session["current_phase"]
+
+        priority = turn_priority(session, prescreen["crisis"])
+        level = service_level(session, priority)
+
+        # Stable sessions skip the Mapper on most turns; the pre-screen above always runs
+        run_mapper, mapper_reason = mapper_decision(
+            session, turn_number, user_input, prescreen["crisis"], shed=level >= LEVEL_SHED_MAPPER
+        )
+
+        # Run the Mapper as a task on the event loop, concurrently with the listener stream; it is
+        # batched with other sessions' mapper calls from the same short window
+        mapper_task = None
+        if run_mapper:
+            mapper_task = asyncio.create_task(mapper_batcher.analyze(
+                full_context_str, req.session_id, priority, on_field=on_mapper_field
+            ))
+        # TTFT counts from here: the wait for a listener slot plus generation, not the turn's setup
+        listener_submitted = time.monotonic()
+        listener_stream = model_scheduler.stream(
+            listener_agent.model_name,
+            listener_agent.agenerate_stream(
+                langchain_history, listener_phase, session["context_summary"],
+                num_predict=overload_controller.listener_num_predict(level),
+            ),
+            req.session_id,
+            priority,
+        )
+        # Batch listener chunks into fewer SSE events; the first chunk is never held back
+        chunks = coalesce_stream(
+            listener_stream,
+            SSE_COALESCE_MS if req.coalesce_ms is None else req.coalesce_ms,
+            SSE_COALESCE_BYTES if req.coalesce_bytes is None else req.coalesce_bytes,
+            SENTENCE_TERMINATORS,
+        )
+        full_response = ""
+        try:
+            # Stream listener response as it is generated
+            async for chunk in chunks:
+                if not full_response:
+                    overload_controller.record_ttft(time.monotonic() - listener_submitted)
                 full_response += chunk
                 yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
-
-            # Wait for the Mapper to finish
-            profile = future_mapper.result()
-
-        # --- State Management (mirrors app0.py / cli.py logic) ---
-        current_risk_score = profile.get("risk_score", 1)
-        self_harm = profile.get("self_harm_indicators", False)
-        crisis_intercept = bool(self_harm or current_risk_score >= CRISIS_RISK_THRESHOLD)
-
-        # Root cause state-locking
-        extracted_root_cause = profile.get("root_cause_of_the_distress", "-")
-        if extracted_root_cause != "-" and session["session_root_cause"] == "-":
-            session["session_root_cause"] = extracted_root_cause
-        elif session["session_root_cause"] != "-":
-            profile["root_cause_of_the_distress"] = session["session_root_cause"]
-
-        session["session_risk_score"] = max(session["session_risk_score"], current_risk_score)
-
-        # Action determination
-        if crisis_intercept:
-            action = "escalate_to_human"
-        elif session["session_root_cause"] != "-" and session["session_risk_score"] >= 5:
-            action = "route_to_peer_group"
-        else:
-            action = "continue_listening"
+                if early_crisis.is_set() and not crisis_announced:
+                    crisis_announced = True
+                    yield crisis_event()
+
+            # Wait for the Mapper within the turn's budget; when it was skipped, is late or its
+            # pool was saturated, degrade to the last profile
+            deadline = turn_started + MAPPER_TURN_BUDGET_SECONDS
+            if mapper_task is None:
+                profile = degraded_profile(session)
+            else:
+                if not crisis_announced:
+                    # Still announce a crisis early if the safety fields land while the summary is generating
+                    crisis_wait = asyncio.create_task(early_crisis.wait())
+                    try:
+                        await asyncio.wait({mapper_task, crisis_wait}, timeout=max(0.0, deadline - time.monotonic()),
+                                           return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        crisis_wait.cancel()
+                    if early_crisis.is_set():
+                        crisis_announced = True
+                        yield crisis_event()
+                await asyncio.wait({mapper_task}, timeout=max(0.0, deadline - time.monotonic()))
+                if not mapper_task.done():
+                    METRICS.incr("mapper.deadline_fallbacks")
+                    print(f"[API WARN] Mapper missed the {MAPPER_TURN_BUDGET_SECONDS}s turn budget. Reusing the previous clinical profile.")
+                    late_mapper_task = mapper_task
+                    profile = degraded_profile(session)
+                    # Safety fields that already streamed in still count for this turn
+                    for field in ("self_harm_indicators", "risk_score"):
+                        if field in early_fields:
+                            profile[field] = early_fields[field]
+                else:
+                    try:
+                        profile = mapper_task.result()
+                        session["last_profile"] = dict(profile)
+                        record_mapper_profile(session, profile, full_context_str)
+                    except PoolSaturated as e:
+                        print(f"[API WARN] {e} Reusing the previous clinical profile for this turn.")
+                        profile = degraded_profile(session)
+        except (asyncio.CancelledError, GeneratorExit) as e:
+            # The turn was cancelled, e.g. because no client reconnected within the grace period
+            reason = e.args[0] if isinstance(e, asyncio.CancelledError) and e.args else "stream_cancelled"
+            log_abandoned_turn(session, user_input, full_response, reason)
+            raise
+        finally:
+            # Abort whatever is still generating: closing the stream and cancelling the task
+            # drops the underlying Ollama HTTP requests, which stops generation server-side
+            if mapper_task is not None and not mapper_task.done() and mapper_task is not late_mapper_task:
+                mapper_task.cancel()
+            await chunks.aclose()
+            await listener_stream.aclose()
 
         # Capture used phase/context before updating for next turn
-        used_phase = session["current_phase"]
+        used_phase = listener_phase
         used_context = session["context_summary"]
-
-        # Update context for next turn
-        session["context_summary"] = profile.get("clinical_summary", "")
-
-        # Phase derivation (priority candidates pattern)
-        candidates = []
-        if crisis_intercept:
-            candidates.append((0, "crisis"))
-        if session["session_root_cause"] != "-":
-            candidates.append((1, "process"))
-        if current_risk_score >= 5:
-            candidates.append((2, "probe"))
-        if len(user_input.split()) < 5 and current_risk_score == 1:
-            candidates.append((3, "greeting"))
-        candidates.append((4, "explore"))
-        session["current_phase"] = min(candidates, key=lambda x: x[0])[1]
+        crisis_intercept, action, current_risk_score = apply_clinical_profile(session, profile, user_input)
+        session["turn_count"] = turn_number
+        session["history"] = (history + [{"role": "assistant", "content": full_response}])[-HISTORY_MAX_MESSAGES:]
+        session["history_seq"] = turn_seq
+        if not profile.get("degraded"):
+            session["profile_turn"] = turn_number
 
         # Peer Matchmaker
         peer_match = None
-        history_len = len(req.chat_history)
+        history_len = len(history)
         if (not crisis_intercept) and session["session_root_cause"] != "-" and current_risk_score >= 5 and history_len >= 4:
-            match = matchmaker.find_match(session["session_root_cause"])
+            match = None
+            if level >= LEVEL_DEFER_MATCHING:
+                # Shedding load; matching is retried on the next qualifying turn
+                METRICS.incr("overload.matching_deferred")
+            else:
+                try:
+                    match = await asyncio.wrap_future(get_executor("matchmaker").submit(
+                        matchmaker.find_match_cached, session["session_root_cause"], session["match_cache"]
+                    ))
+                except PoolSaturated as e:
+                    # Matching is retried on the next qualifying turn
+                    print(f"[API WARN] {e} Deferring peer matching.")
             if match:
                 peer_match = match
-                # Always pre-seed availability so frontend never gets undefined
-                peer_match["availability"] = []
-                # Intercept match and attach dynamic availability from peers.json
-                try:
-                    peers_path = os.path.join(PROJECT_ROOT, "data", "peers.json")
-                    with open(peers_path, "r", encoding="utf-8") as f:
-                        peers_db = json.load(f)
-                    matched_pid = peer_match.get("peer_id", "")
-                    print(f"[DEBUG] Looking up availability for peer_id='{matched_pid}'")
-                    found = False
-                    for p in peers_db:
-                        if p.get("peer_id") == matched_pid:
-                            peer_match["availability"] = p.get("availability", [])
-                            print(f"[DEBUG] Found availability: {peer_match['availability']}")
-                            found = True
-                            break
-                    if not found:
-                        print(f"[DEBUG] peer_id='{matched_pid}' not found in peers.json!")
-                except Exception as e:
-                    print(f"[API ERROR] Failed to load availability array: {e}")
-                    peer_match["availability"] = []
+                # Attach the peer's sorted, still-free availability so the frontend never gets undefined
+                matched_pid = peer_match.get("peer_id", "")
+                booked = {a["selected_slot"] for a in await asyncio.to_thread(appointment_store.for_peer, matched_pid)}
+                peer_match["availability"] = [
+                    slot for slot in peer_directory.availability(matched_pid) if slot["start_time"] not in booked
+                ]
+                if peer_directory.get(matched_pid) is None:
+                    print(f"[DEBUG] peer_id='{matched_pid}' not found in peers.json!")
 
         # Log the turn
         log_entry = {
@@ -229,25 +593,70 @@ async def chat(req: ChatRequest):
             "crisis_intercept": crisis_intercept,
             "peer_group_match": peer_match,
             "clinical_profile": profile,
+            "crisis_prescreen": prescreen["matches"],
+            "mapper_schedule": {"run": run_mapper, "reason": mapper_reason},
+            "service_level": level,
         }
-        try:
-            with open(session["log_file"], "r") as f:
-                logs = json.load(f)
-            logs.append(log_entry)
-            with open(session["log_file"], "w") as f:
-                json.dump(logs, f, indent=4)
-        except Exception as e:
-            print(f"[LOG ERROR]: {e}")
+        await LOG_WRITER.aappend(session["log_file"], log_entry)
+        await asyncio.to_thread(session_store.save, req.session_id, session)
+        if late_mapper_task is not None:
+            spawn_background(apply_late_profile(
+                req.session_id, late_mapper_task, user_input, full_context_str, deadline, turn_number
+            ))
 
         # Send the final metadata event (peer match info + crisis routing flag)
-        yield f"data: {json.dumps({'type': 'metadata', 'peer_group_match': peer_match, 'crisis_intercept': crisis_intercept})}\n\n"
+        yield f"data: {json.dumps({'type': 'metadata', 'peer_group_match': peer_match, 'crisis_intercept': crisis_intercept, 'turn_seq': turn_seq})}\n\n"
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    async def generate():
+        # Hold the session's lock for the whole turn so concurrent turns of one session
+        # (possibly in other worker processes) apply their state updates in order
+        try:
+            async with session_store.alock(req.session_id):
+                turn = run_turn()
+                try:
+                    async for event in turn:
+                        yield event
+                finally:
+                    await turn.aclose()
+        except (SessionBusy, PoolSaturated) as e:
+            # Let a retry run the turn instead of replaying this error
+            turn_registry.forget(req.session_id, key)
+            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+
+    # The turn runs as its own task, so a dropped connection does not stop it straight away
+    turn = TurnStream(req.session_id, key)
+    turn_registry.add(turn)
+    turn.start(generate())
+    return turn_response(turn, 0, request)
+
+
+@app.get("/api/chat/{turn_id}/events")
+async def chat_events(turn_id: str, request: Request):
+    """
+    Resumes a turn's SSE stream after the Last-Event-ID header (or from the start).
+    """
+    turn = turn_registry.get(turn_id)
+    if turn is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Unknown or expired turn."})
+    event_turn_id, after = parse_event_id(request.headers.get("last-event-id"))
+    METRICS.incr("sse.resume.resumed")
+    return turn_response(turn, after if event_turn_id == turn_id else 0, request)
 
 
 # ---------------------------------------------------------------------------
 # Voice STT Endpoint
 # ---------------------------------------------------------------------------
+def remember_voice_language(session_id: str, detected_language: str, language_probability: float) -> str:
+    # Runs in a worker thread: it may wait for an in-flight chat turn of the same session
+    with session_store.lock(session_id):
+        session = get_or_create_session(session_id)
+        effective_voice_language = session.get("preferred_voice_language", DEFAULT_VOICE_LANGUAGE)
+        if language_probability >= VOICE_LANGUAGE_CONFIDENCE_THRESHOLD:
+            session["preferred_voice_language"] = detected_language
+            effective_voice_language = detected_language
+            session_store.save(session_id, session)
+    return effective_voice_language
+
 @app.post("/api/transcribe")
 async def transcribe_voice(audio: UploadFile = File(...), session_id: str | None = Form(None)):
     try:
@@ -255,22 +664,21 @@ async def transcribe_voice(audio: UploadFile = File(...), session_id: str | None
         if not audio_bytes:
             return {"status": "error", "message": "Uploaded audio file is empty."}
 
-        stt_result = transcribe_audio(
+        stt_result = await asyncio.wrap_future(get_executor("voice").submit(
+            transcribe_audio,
             audio_bytes=audio_bytes,
             filename=audio.filename or "voice_note.webm",
             content_type=audio.content_type or "audio/webm",
-        )
+        ))
 
         detected_language = stt_result.get("detected_language_code") or DEFAULT_VOICE_LANGUAGE
         language_probability = float(stt_result.get("language_probability", 0.0))
         effective_voice_language = detected_language
 
         if session_id:
-            session = get_or_create_session(session_id)
-            effective_voice_language = session.get("preferred_voice_language", DEFAULT_VOICE_LANGUAGE)
-            if language_probability >= VOICE_LANGUAGE_CONFIDENCE_THRESHOLD:
-                session["preferred_voice_language"] = detected_language
-                effective_voice_language = detected_language
+            effective_voice_language = await asyncio.to_thread(
+                remember_voice_language, session_id, detected_language, language_probability
+            )
 
         return {
             "status": "success",
@@ -295,19 +703,22 @@ async def tts_response(req: TTSRequest):
 
         target_language = req.target_language_code
         if not target_language and req.session_id:
-            session = get_or_create_session(req.session_id)
+            async with session_store.alock(req.session_id):
+                session = await asyncio.to_thread(get_or_create_session, req.session_id)
             target_language = session.get("preferred_voice_language", DEFAULT_VOICE_LANGUAGE)
         if not target_language:
             target_language = DEFAULT_VOICE_LANGUAGE
 
         spoken_text = clean_text
         try:
-            spoken_text = translate_text(clean_text, target_language)
+            spoken_text = await asyncio.wrap_future(get_executor("voice").submit(translate_text, clean_text, target_language))
+        except PoolSaturated:
+            raise
         except Exception as translation_error:
             print(f"[VOICE WARN] Translation failed, falling back to original text: {translation_error}")
             spoken_text = clean_text
 
-        tts_result = synthesize_speech(spoken_text, target_language)
+        tts_result = await asyncio.wrap_future(get_executor("voice").submit(synthesize_speech, spoken_text, target_language))
         audio_base64 = base64.b64encode(tts_result["audio_bytes"]).decode("utf-8")
 
         return {
@@ -325,27 +736,35 @@ async def tts_response(req: TTSRequest):
 # Peer Scheduling Endpoint
 # ---------------------------------------------------------------------------
 @app.post("/api/schedule")
-async def schedule_connection(req: ScheduleRequest):
+def schedule_connection(req: ScheduleRequest):
     try:
-        appointments_file = os.path.join(PROJECT_ROOT, "data", "appointments.json")
-        if not os.path.exists(appointments_file):
-            with open(appointments_file, "w", encoding="utf-8") as f:
-                json.dump([], f)
-                
-        with open(appointments_file, "r", encoding="utf-8") as f:
-            appts = json.load(f)
-            
-        appt_record = {
-            "session_id": req.session_id,
-            "peer_id": req.peer_id,
-            "selected_slot": req.selected_slot,
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        appts.append(appt_record)
-        
-        with open(appointments_file, "w", encoding="utf-8") as f:
-            json.dump(appts, f, indent=4)
-            
+        if peer_directory.get(req.peer_id) is None:
+            return {"status": "error", "message": f"Unknown peer '{req.peer_id}'."}
+        # Only slots the peer actually offers can be booked, stored as the peer lists them
+        slot = peer_directory.listed_slot(req.peer_id, req.selected_slot)
+        if slot is None:
+            return JSONResponse(status_code=400, content={
+                "status": "error", "message": f"{req.peer_id} is not available at {req.selected_slot}.",
+            })
+
+        appointment_store.book(req.session_id, req.peer_id, slot)
         return {"status": "success"}
+    except SlotAlreadyBooked as e:
+        return JSONResponse(status_code=409, content={"status": "error", "message": str(e)})
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+
+# ---------------------------------------------------------------------------
+# Metrics Endpoint
+# ---------------------------------------------------------------------------
+@app.get("/api/metrics")
+async def metrics():
+    snapshot = METRICS.snapshot()
+    snapshot["sessions"] = session_store.stats()
+    snapshot["mapper_cache"] = mapper_agent.cache.stats()
+    snapshot["prompts"] = {"listener": listener_agent.packer.stats(), "mapper": mapper_agent.packer.stats()}
+    snapshot["listener"] = listener_agent.stats()
+    snapshot["scheduler"] = model_scheduler.stats()
+    snapshot["overload"] = overload_controller.stats()
+    return snapshot
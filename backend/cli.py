@@ -1,28 +1,19 @@
 import uuid
-import json
-import os
-import concurrent.futures
 from langchain_core.messages import HumanMessage, AIMessage
 
 
 from agents.listener import ListenerAgent
 from agents.mapper import ClinicalMapperAgent
+from utils.executors import PoolSaturated, get_executor
+from utils.mapper_cache import MapperCache
 from utils.matchmaker import PeerMatchmaker
+from utils.session_log import LOG_WRITER, allocate_session_log
 
 def run_cli():
     session_id = str(uuid.uuid4())
     raw_history = []
-    log_dir = "session_logs"
-    os.makedirs(log_dir, exist_ok=True)
-    
-    # Generate sequential log filename
-    existing_logs = [f for f in os.listdir(log_dir) if f.startswith("session_log") and f.endswith(".json")]
-    next_index = len(existing_logs) + 1
-    log_file = os.path.join(log_dir, f"session_log{next_index}.json")
-    
-    with open(log_file, "w") as f:
-        json.dump([], f)
-        
+    log_file = allocate_session_log("session_logs")
+
     print("=" * 60)
     print("KALPANA 6.0 - EMOTIONAL SUPPORT CLI")
     print("=" * 60)
@@ -33,7 +24,7 @@ def run_cli():
     print(" Ready.")
     
     print(" - Loading Mapper Agent...", end="", flush=True)
-    mapper_agent = ClinicalMapperAgent()
+    mapper_agent = ClinicalMapperAgent(cache=MapperCache())
     print(" Ready.")
     
     print(" - Connecting to Vector Database...", end="", flush=True)
@@ -46,6 +37,8 @@ def run_cli():
     session_root_cause = "-" # State-locking variable
     current_phase = "explore"   # Safe default for Turn 1
     context_summary = ""        # No clinical context yet
+    match_cache = {}            # Memoized peer match for the locked root cause
+    last_profile = None         # Reused when the mapper pool is saturated
     
     while True:
         try:
@@ -73,20 +66,35 @@ def run_cli():
             transcript_lines.append(f"User: {user_input}")
             full_context_str = "\n".join(transcript_lines)
 
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                # Give Mapper full context string instead of just the latest sentence
-                future_mapper = executor.submit(mapper_agent.analyze, full_context_str)
-                
-                print(f"\nKalpana: ", end="", flush=True)
-                full_listener_response = ""
-                
-                for chunk in listener_agent.generate_stream(langchain_history, current_phase, context_summary):
-                    print(chunk, end="", flush=True)
-                    full_listener_response += chunk
-                print("\n")
+            # Give Mapper full context string instead of just the latest sentence
+            try:
+                future_mapper = get_executor("mapper").submit(mapper_agent.analyze, full_context_str)
+            except PoolSaturated as e:
+                print(f"[WARN]: {e} Reusing the previous clinical profile for this turn.")
+                future_mapper = None
+
+            print(f"\nKalpana: ", end="", flush=True)
+            full_listener_response = ""
 
+            for chunk in listener_agent.generate_stream(langchain_history, current_phase, context_summary):
+                print(chunk, end="", flush=True)
+                full_listener_response += chunk
+            print("\n")
+
+            if future_mapper is not None:
                 profile = future_mapper.result()
-                print(f"[DEBUG MAPPER]: {profile}")
+                last_profile = dict(profile)
+            else:
+                profile = dict(last_profile or {
+                    "clinical_summary": context_summary,
+                    "primary_emotion": "unknown",
+                    "detected_risk": "low",
+                    "self_harm_indicators": False,
+                    "risk_score": 1,
+                    "root_cause_of_the_distress": session_root_cause,
+                })
+                profile["degraded"] = True
+            print(f"[DEBUG MAPPER]: {profile}")
             # If the mapper fails completely, don't overwrite previous critical decisions
             current_risk_score = profile.get("risk_score", 1)
             risk_level = profile.get("detected_risk", "low").lower()
@@ -130,7 +138,7 @@ def run_cli():
             # Check for peer match based on locked root cause and risk score
             # We require at least 4 items in raw_history (including the 2 being added this turn)
             if session_root_cause != "-" and current_risk_score >= 5 and (len(raw_history) + 2) >= 4:
-                match = matchmaker.find_match(session_root_cause)
+                match = matchmaker.find_match_cached(session_root_cause, match_cache)
                 if match:
                     print(f"\n[PEER MATCH]: I've found someone who has gone through something similar. They are available to talk.")
                     print(f"Type 'connect' if you'd like to reach out to them.")
@@ -150,14 +158,7 @@ def run_cli():
                 "peer_group_match": peer_group,
                 "clinical_profile": profile
             }
-            
-            with open(log_file, "r") as f:
-                logs = json.load(f)
-                
-            logs.append(log_entry)
-            
-            with open(log_file, "w") as f:
-                json.dump(logs, f, indent=4)
+            LOG_WRITER.append(log_file, log_entry)
 
             raw_history.append({"role": "user", "content": user_input})
             raw_history.append({"role": "assistant", "content": full_listener_response})
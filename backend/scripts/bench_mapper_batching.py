@@ -0,0 +1,140 @@
+"""
+Mapper throughput per GPU-second with cross-session micro-batching versus one-at-a-time dispatch.
+Both runs send the same distinct transcripts (no duplicates, so sharing cannot help) through a
+ModelScheduler that allows one mapper admission at a time; the batched run lets each admission
+carry up to --max-batch transcripts collected within --window-ms. Runs against whatever
+OLLAMA_BASE_URL points at, e.g. scripts/fake_ollama.py with as many parallel slots as the batch:
+
+    python scripts/fake_ollama.py --parallel 4 &
+    OLLAMA_BASE_URL=http://localhost:11435 python scripts/bench_mapper_batching.py --sessions 32
+
+Throughput is reported per GPU-second, counting the time at least one mapper request was in
+flight (the mapper model has the GPU to itself).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+# Ensure the backend directory is in the path so we can import agents and utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.mapper import ClinicalMapperAgent
+from utils.mapper_batcher import MAPPER_BATCH_MAX, MAPPER_BATCH_WINDOW_MS, MapperBatcher
+from utils.model_scheduler import ModelScheduler
+
+OPENERS = [
+    "User: I failed my semester exams and my parents don't know yet.",
+    "User: I lost my job last week and I can't sleep.",
+    "User: My grandmother passed away and I feel numb.",
+    "User: My partner left me and I keep crying at work.",
+    "User: I feel lonely all the time, even with people around.",
+    "User: There is a lot of shouting at home and I can't focus.",
+]
+FOLLOW_UPS = [
+    "User: It has been like this for a month.",
+    "User: I don't really want to talk to anyone about it.",
+    "User: Some days I can't get out of bed.",
+    "User: I keep thinking it is all my fault.",
+]
+
+
+def make_transcripts(count: int, seed: int) -> list:
+    # Every transcript is distinct, as across real sessions
+    rng = random.Random(seed)
+    return ["\n".join([rng.choice(OPENERS), rng.choice(FOLLOW_UPS), f"User: (session {i})"]) for i in range(count)]
+
+
+class BusyClock:
+    """
+    Wraps mapper.aanalyze to measure the union of time with at least one request in flight.
+    """
+
+    def __init__(self, mapper):
+        self.mapper = mapper
+        self.requests = 0
+        self.busy_seconds = 0.0
+        self._active = 0
+        self._since = 0.0
+        self._analyze = mapper.aanalyze
+        mapper.aanalyze = self.aanalyze
+
+    async def aanalyze(self, transcript: str, on_field=None, **kwargs) -> dict:
+        self.requests += 1
+        if self._active == 0:
+            self._since = time.monotonic()
+        self._active += 1
+        try:
+            return await self._analyze(transcript, on_field=on_field, **kwargs)
+        finally:
+            self._active -= 1
+            if self._active == 0:
+                self.busy_seconds += time.monotonic() - self._since
+
+
+async def run_arrivals(analyze, transcripts: list, delays: list) -> list:
+    async def one(i: int, transcript: str) -> float:
+        # Sessions arrive spread out, as concurrent turns would
+        await asyncio.sleep(delays[i])
+        started = time.monotonic()
+        await analyze(transcript, f"bench-{i}")
+        return time.monotonic() - started
+
+    return await asyncio.gather(*(one(i, t) for i, t in enumerate(transcripts)))
+
+
+async def run_one_at_a_time(mapper, transcripts: list, delays: list, args) -> list:
+    scheduler = ModelScheduler({mapper.model_name: 1})
+
+    async def analyze(transcript: str, session_id: str) -> dict:
+        return await scheduler.run(mapper.model_name, mapper.aanalyze(transcript), session_id)
+
+    return await run_arrivals(analyze, transcripts, delays)
+
+
+async def run_batched(mapper, transcripts: list, delays: list, args) -> list:
+    batcher = MapperBatcher(mapper, ModelScheduler({mapper.model_name: 1}), args.window_ms, args.max_batch)
+    return await run_arrivals(batcher.analyze, transcripts, delays)
+
+
+def report(name: str, clock: BusyClock, latencies: list, wall: float) -> float:
+    throughput = len(latencies) / clock.busy_seconds if clock.busy_seconds else 0.0
+    print(f"\n[{name}]")
+    print(f"  analyses:            {len(latencies)} ({clock.requests} Ollama requests)")
+    print(f"  wall time:           {wall:.2f}s")
+    print(f"  GPU-busy time:       {clock.busy_seconds:.2f}s")
+    print(f"  analyses / GPU-sec:  {throughput:.2f}")
+    print(f"  latency mean / max:  {statistics.mean(latencies):.3f}s / {max(latencies):.3f}s")
+    return throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mapper throughput with and without micro-batching.")
+    parser.add_argument("--sessions", type=int, default=32, help="Mapper analyses to run.")
+    parser.add_argument("--spread-ms", type=float, default=100, help="Window over which sessions arrive.")
+    parser.add_argument("--window-ms", type=float, default=MAPPER_BATCH_WINDOW_MS, help="Batch collection window.")
+    parser.add_argument("--max-batch", type=int, default=MAPPER_BATCH_MAX, help="Transcripts per batch.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    transcripts = make_transcripts(args.sessions, args.seed)
+    rng = random.Random(args.seed)
+    delays = [rng.random() * args.spread_ms / 1000 for _ in transcripts]
+    # No cache and no duplicates, so every analysis is its own Ollama request in both runs
+    results = []
+    for name, run in (("one at a time", run_one_at_a_time), ("batched", run_batched)):
+        clock = BusyClock(ClinicalMapperAgent())
+        started = time.monotonic()
+        latencies = asyncio.run(run(clock.mapper, transcripts, delays, args))
+        results.append(report(name, clock, latencies, time.monotonic() - started))
+
+    if all(results):
+        print(f"\n  throughput per GPU-second: {results[1] / results[0]:.2f}x one-at-a-time dispatch "
+              f"({args.max_batch} per batch, {args.window_ms:g} ms window)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from pinecone import Pinecone
+from sentence_transformers import SentenceTransformer
+
+# Ensure the backend directory is in the path so we can import utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.peer_index import (
+    EMBEDDINGS_FILE,
+    MANIFEST_FILE,
+    SIDECAR_FILE,
+    SUPPORTED_DTYPES,
+    index_version,
+    iter_peer_records,
+    new_build_dir,
+    normalize_rows,
+    peer_content_hash,
+    peer_embedding_text,
+    peer_metadata,
+    publish_build,
+    read_index_files,
+    source_file_hash,
+)
+from utils.matchmaker import EMBEDDING_MODEL, INDEX_NAME, PEER_INDEX_DIR, PEERS_FILE
+
+
+def load_previous_rows(index_dir: str, dtype: str):
+    """
+    Maps peer_id -> (content_hash, embedding row) from the last build, if it is reusable.
+    """
+    files = read_index_files(index_dir)
+    if files is None:
+        return {}, None
+    manifest, rows, matrix = files
+    if manifest.get("model") != EMBEDDING_MODEL or manifest.get("dtype") != dtype:
+        print(f"[BUILD]: Previous index used {manifest.get('model')}/{manifest.get('dtype')}. Re-embedding everything.")
+        return {}, None
+    previous = {row["peer_id"]: (row["content_hash"], i) for i, row in enumerate(rows)}
+    return previous, matrix
+
+
+def upsert_to_pinecone(rows: list, matrix, targets: list, removed_ids: list, batch_size: int):
+    api_key = os.getenv("PINECONE_API_KEY")
+    if not api_key:
+        raise ValueError("PINECONE_API_KEY not found in environment.")
+    index = Pinecone(api_key=api_key).Index(INDEX_NAME)
+
+    # Build each batch straight from the memory map so 100k+ vectors never sit in memory as lists
+    for start in range(0, len(targets), batch_size):
+        vectors = [
+            {"id": rows[i][0], "values": np.asarray(matrix[i], dtype=np.float32).tolist(), "metadata": rows[i][2]}
+            for i in targets[start:start + batch_size]
+        ]
+        index.upsert(vectors=vectors)
+        print(f"[PINECONE]: Upserted {min(start + batch_size, len(targets))}/{len(targets)} vectors.")
+    for start in range(0, len(removed_ids), batch_size):
+        index.delete(ids=removed_ids[start:start + batch_size])
+    if removed_ids:
+        print(f"[PINECONE]: Deleted {len(removed_ids)} peers that are no longer in the corpus.")
+
+
+def build_index(source: str, index_dir: str, dtype: str, batch_size: int,
+                upsert: bool = False, upsert_all: bool = False, upsert_batch_size: int = 100):
+    os.makedirs(index_dir, exist_ok=True)
+    previous, previous_matrix = load_previous_rows(index_dir, dtype)
+
+    # Pass 1: hash every peer and decide which ones actually need a forward pass
+    rows = []
+    seen_ids = set()
+    for peer in iter_peer_records(source):
+        peer_id = peer["peer_id"]
+        if peer_id in seen_ids:
+            print(f"[BUILD WARN]: Duplicate peer_id '{peer_id}', keeping the first record.")
+            continue
+        seen_ids.add(peer_id)
+        content_hash = peer_content_hash(peer, EMBEDDING_MODEL)
+        old = previous.get(peer_id)
+        reuse_row = old[1] if old and old[0] == content_hash else None
+        text = None if reuse_row is not None else peer_embedding_text(peer)
+        rows.append((peer_id, content_hash, peer_metadata(peer), text, reuse_row))
+
+    changed = [i for i, row in enumerate(rows) if row[3] is not None]
+    removed_ids = [peer_id for peer_id in previous if peer_id not in seen_ids]
+    print(f"[BUILD]: {len(rows)} peers, {len(changed)} to embed, {len(rows) - len(changed)} reused, {len(removed_ids)} removed.")
+
+    # Only pay for loading the encoder when something actually needs embedding
+    model = SentenceTransformer(EMBEDDING_MODEL) if changed or previous_matrix is None else None
+    dim = model.get_sentence_embedding_dimension() if model else previous_matrix.shape[1]
+
+    # Every build is written to its own directory; readers only see it once CURRENT points there
+    version = index_version([r[0] for r in rows], [r[1] for r in rows])
+    built_at = datetime.datetime.now()
+    build_dir = new_build_dir(index_dir, f"{built_at.strftime('%Y%m%dT%H%M%S%f')}-{version[:12]}")
+
+    # Pass 2: fill a fresh memory-mapped matrix, copying unchanged rows and embedding the rest in batches
+    embeddings_path = os.path.join(build_dir, EMBEDDINGS_FILE)
+    matrix = np.lib.format.open_memmap(embeddings_path, mode="w+", dtype=SUPPORTED_DTYPES[dtype], shape=(len(rows), dim))
+    for i, row in enumerate(rows):
+        if row[4] is not None:
+            matrix[i] = previous_matrix[row[4]]
+
+    started = time.perf_counter()
+    for start in range(0, len(changed), batch_size):
+        batch = changed[start:start + batch_size]
+        embeddings = model.encode([rows[i][3] for i in batch], batch_size=batch_size, convert_to_numpy=True)
+        matrix[batch] = normalize_rows(embeddings.astype(np.float32))
+        print(f"[BUILD]: Embedded {min(start + batch_size, len(changed))}/{len(changed)} peers.")
+    matrix.flush()
+    if changed:
+        print(f"[BUILD]: Embedding took {time.perf_counter() - started:.1f}s.")
+
+    # Release both memory maps before the old build can be pruned
+    del matrix
+    previous_matrix = None
+
+    with open(os.path.join(build_dir, SIDECAR_FILE), "w", encoding="utf-8") as f:
+        for peer_id, content_hash, metadata, _, _ in rows:
+            f.write(json.dumps({"peer_id": peer_id, "content_hash": content_hash, "metadata": metadata}, ensure_ascii=False) + "\n")
+
+    manifest = {
+        "model": EMBEDDING_MODEL,
+        "dim": dim,
+        "dtype": dtype,
+        "count": len(rows),
+        "index_version": version,
+        "source": os.path.abspath(source),
+        "source_hash": source_file_hash(source),
+        "built_at": built_at.isoformat(),
+    }
+    with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+
+    # A single atomic pointer swap, so a concurrent load sees either the old build or the new one
+    publish_build(index_dir, build_dir)
+    print(f"[SUCCESS]: Wrote index {version[:12]} to {build_dir}")
+
+    if upsert:
+        targets = list(range(len(rows))) if upsert_all else changed
+        matrix = np.load(embeddings_path, mmap_mode="r")
+        upsert_to_pinecone(rows, matrix, targets, removed_ids, upsert_batch_size)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the memory-mapped peer embedding index.")
+    parser.add_argument("--source", default=PEERS_FILE, help="peers.json array or a .jsonl export")
+    parser.add_argument("--index-dir", default=PEER_INDEX_DIR)
+    parser.add_argument("--dtype", default="float32", choices=sorted(SUPPORTED_DTYPES))
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--pinecone", action="store_true", help="Upsert changed peers to the Pinecone index")
+    parser.add_argument("--pinecone-all", action="store_true", help="Upsert every peer, not only changed ones")
+    parser.add_argument("--pinecone-batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    build_index(
+        args.source,
+        args.index_dir,
+        args.dtype,
+        args.batch_size,
+        upsert=args.pinecone or args.pinecone_all,
+        upsert_all=args.pinecone_all,
+        upsert_batch_size=args.pinecone_batch_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Ensure the backend directory is in the path so we can import utils
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.crisis_screen import CRISIS_PHRASES_FILE, PROJECT_ROOT, CrisisScreen
+
+DEFAULT_FIXTURES = os.path.join(PROJECT_ROOT, "data", "crisis_screen_fixtures.jsonl")
+# Floors the shipped phrase list must hold on the fixture set (also enforced by tests/test_crisis_screen.py)
+MIN_PRECISION = 0.9
+MIN_RECALL = 0.9
+
+
+def load_fixtures(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(screen: CrisisScreen, fixtures: list) -> dict:
+    tp = fp = fn = tn = 0
+    errors = []
+    for case in fixtures:
+        result = screen.screen(case["text"])
+        if result["crisis"] and case["crisis"]:
+            tp += 1
+        elif result["crisis"]:
+            fp += 1
+            errors.append(("FALSE POSITIVE", case, result["matches"]))
+        elif case["crisis"]:
+            # Fixtures marked known_miss still count against recall; they are only labelled
+            fn += 1
+            errors.append(("KNOWN MISS" if case.get("known_miss") else "FALSE NEGATIVE", case, []))
+        else:
+            tn += 1
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    return {"tp": tp, "fp": fp, "fn": fn, "tn": tn, "precision": precision, "recall": recall, "errors": errors}
+
+
+def benchmark(screen: CrisisScreen, texts: list, rounds: int) -> dict:
+    timings = []
+    for _ in range(rounds):
+        for text in texts:
+            started = time.perf_counter()
+            screen.screen(text)
+            timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6,
+        "max_us": timings[-1] * 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precision/recall and latency of the lexical crisis pre-screen.")
+    parser.add_argument("--phrases", default=CRISIS_PHRASES_FILE)
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES)
+    parser.add_argument("--rounds", type=int, default=200, help="Benchmark passes over the fixture set.")
+    parser.add_argument("--min-precision", type=float, default=MIN_PRECISION)
+    parser.add_argument("--min-recall", type=float, default=MIN_RECALL)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    screen = CrisisScreen.from_file(args.phrases)
+    build_ms = (time.perf_counter() - started) * 1000
+    fixtures = load_fixtures(args.fixtures)
+
+    report = evaluate(screen, fixtures)
+    print("=" * 60)
+    print("CRISIS PRE-SCREEN EVALUATION")
+    print("=" * 60)
+    print(f"Fixtures:  {len(fixtures)} ({sum(c['crisis'] for c in fixtures)} crisis)")
+    print(f"TP={report['tp']} FP={report['fp']} FN={report['fn']} TN={report['tn']}")
+    print(f"Precision: {report['precision']:.3f}")
+    print(f"Recall:    {report['recall']:.3f}")
+    for kind, case, matches in report["errors"]:
+        detail = f" matched {matches}" if matches else ""
+        if kind == "KNOWN MISS":
+            detail = f" ({case['known_miss']})"
+        print(f"  {kind} [{case.get('lang', '?')}]: {case['text']!r}{detail}")
+
+    timing = benchmark(screen, [case["text"] for case in fixtures], args.rounds)
+    print("-" * 60)
+    print(f"Matcher build: {build_ms:.2f} ms")
+    print(f"Screen calls:  {timing['calls']}")
+    print(f"Latency (us):  mean={timing['mean_us']:.1f} p50={timing['p50_us']:.1f} "
+          f"p99={timing['p99_us']:.1f} max={timing['max_us']:.1f}")
+
+    if report["precision"] < args.min_precision or report["recall"] < args.min_recall:
+        print("[FAIL]: Precision/recall below the required minimum.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+A stand-in Ollama server for load-testing the API without models. It speaks the streaming
+/api/chat and /api/generate protocol (NDJSON lines) with configurable latency, caps how many
+requests each model serves at once like OLLAMA_NUM_PARALLEL, and records what it saw.
+
+    python scripts/fake_ollama.py --port 11435 --parallel 2
+    OLLAMA_BASE_URL=http://localhost:11435 uvicorn api:app
+
+GET /stats returns per-model request counts, peak concurrency and queue waits; POST /stats/reset
+clears them.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LISTENER_REPLY = (
+    "I hear you, and I'm glad you told me. That sounds like a lot to carry on your own. "
+    "What has been the hardest part of it for you this week?"
+)
+CRISIS_WORDS = re.compile(r"suicide|kill myself|end my life|want to die|hurt myself", re.IGNORECASE)
+
+
+def mapper_reply(text: str) -> str:
+    crisis = bool(CRISIS_WORDS.search(text))
+    return json.dumps({
+        "self_harm_indicators": crisis,
+        "risk_score": 9 if crisis else 3,
+        "detected_risk": "high" if crisis else "low",
+        "primary_emotion": "despair" if crisis else "stress",
+        "root_cause_of_the_distress": "academic pressure",
+        "clinical_summary": "The user describes ongoing stress" + (" and thoughts of self-harm." if crisis else "."),
+    })
+
+
+class FakeOllama:
+    def __init__(self, parallel: int, first_token_delay: float, token_delay: float):
+        self.parallel = parallel
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self._slots = defaultdict(lambda: threading.BoundedSemaphore(parallel))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (model, last message) in the order requests started generating
+            self.arrivals = []
+            self.stats = defaultdict(lambda: {"requests": 0, "active": 0, "peak_active": 0,
+                                              "queue_wait_total": 0.0, "cancelled": 0})
+
+    def _enter(self, model: str, label: str, waited: float):
+        with self._lock:
+            self.arrivals.append((model, label))
+            entry = self.stats[model]
+            entry["requests"] += 1
+            entry["active"] += 1
+            entry["peak_active"] = max(entry["peak_active"], entry["active"])
+            entry["queue_wait_total"] += waited
+
+    def _leave(self, model: str, cancelled: bool):
+        with self._lock:
+            self.stats[model]["active"] -= 1
+            self.stats[model]["cancelled"] += int(cancelled)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {model: dict(entry) for model, entry in self.stats.items()}
+
+    def serve(self, model: str, reply: str, write_line, chat: bool, label: str = ""):
+        """
+        Streams reply word by word through write_line once a slot of model is free.
+        """
+        queued = time.monotonic()
+        with self._slots[model]:
+            self._enter(model, label, time.monotonic() - queued)
+            cancelled = False
+            try:
+                time.sleep(self.first_token_delay)
+                pieces = re.findall(r"\S+\s*", reply)
+                for piece in pieces:
+                    write_line(self._line(model, piece, chat, done=False))
+                    time.sleep(self.token_delay)
+                write_line(self._line(model, "", chat, done=True, eval_count=len(pieces)))
+            except (BrokenPipeError, ConnectionResetError):
+                # The client closed the stream; a real server stops generating here too
+                cancelled = True
+            finally:
+                self._leave(model, cancelled)
+
+    def _line(self, model: str, text: str, chat: bool, done: bool, eval_count: int = 0) -> dict:
+        line = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+        if chat:
+            line["message"] = {"role": "assistant", "content": text}
+        else:
+            line["response"] = text
+        if done:
+            line.update({"done_reason": "stop", "eval_count": eval_count, "prompt_eval_count": 0})
+        return line
+
+
+def make_handler(server: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status: int, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _write_chunk(self, line: dict):
+            data = (json.dumps(line) + "\n").encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._json(200, {"models": [{"name": "ministral-3:3b"}, {"name": "gemma3:4b"}]})
+            elif self.path == "/stats":
+                self._json(200, server.snapshot())
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if self.path == "/stats/reset":
+                server.reset()
+                self._json(200, {"status": "ok"})
+                return
+            if self.path not in ("/api/chat", "/api/generate"):
+                self._json(404, {"error": "not found"})
+                return
+
+            chat = self.path == "/api/chat"
+            messages = body.get("messages") or [{}]
+            prompt = " ".join(m.get("content", "") for m in messages) if chat else body.get("prompt", "")
+            if (chat and not body.get("messages")) or (not chat and not prompt):
+                # A load-only request (as sent by warm_up_models.py)
+                reply = ""
+            else:
+                reply = mapper_reply(prompt) if body.get("format") == "json" else LISTENER_REPLY
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            label = messages[-1].get("content", "") if chat else prompt
+            server.serve(body.get("model", "unknown"), reply, self._write_chunk, chat, label)
+            try:
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--parallel", type=int, default=2, help="requests served at once per model")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between tokens")
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.parallel, args.first_token_delay, args.token_delay)
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    httpd.daemon_threads = True
+    print(f"[FAKE OLLAMA] Listening on http://{args.host}:{args.port} ({args.parallel} parallel per model)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+One-time download of the tokenizer.json for each Ollama model the agents run, into
+data/tokenizers/, where the prompt packer loads them from. The app itself never downloads.
+
+    python backend/scripts/fetch_tokenizers.py [--repo gemma3:4b=google/gemma-3-4b-it]
+
+Gated repos (Gemma) need HF_TOKEN set for an account that accepted the licence.
+"""
+import argparse
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from agents.prompt_packer import PROMPT_TOKENIZER_DIR, tokenizer_path
+
+# Hugging Face repos of the weights each Ollama tag is built from
+MODEL_REPOS = {
+    "ministral-3:3b": "mistralai/Ministral-3-3B-Instruct-2512",
+    "gemma3:4b": "google/gemma-3-4b-it",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repo", action="append", default=[], metavar="MODEL=REPO",
+                        help="override the Hugging Face repo for a model")
+    args = parser.parse_args()
+
+    from huggingface_hub import hf_hub_download
+
+    repos = dict(MODEL_REPOS)
+    for override in args.repo:
+        model, _, repo = override.partition("=")
+        repos[model] = repo
+    os.makedirs(PROMPT_TOKENIZER_DIR, exist_ok=True)
+    failed = 0
+    for model, repo in repos.items():
+        try:
+            shutil.copyfile(hf_hub_download(repo, "tokenizer.json"), tokenizer_path(model))
+            print(f"[FETCHED]: {model} <- {repo} -> {tokenizer_path(model)}")
+        except Exception as e:
+            failed += 1
+            print(f"[FAILED]: {model} <- {repo}: {e}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
+import os
 import requests
 import json
 
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
 MODELS = {
     "ministral-3:3b": {"num_gpu":0, "num_ctx": 4096},   # Use CPU for the conversational friend
     "gemma3:4b": {"num_gpu": -1, "num_ctx": 4096}       # Use GPU for the clinical mapper
@@ -15,7 +18,7 @@ def warm_up():
         print(f"\n[WARMING UP]: {model} (GPU: {'YES' if options['num_gpu'] == -1 else 'NO'})...")
         try:
             response = requests.post(
-                "http://localhost:11434/api/generate",
+                f"{OLLAMA_BASE_URL}/api/generate",
                 json={
                     "model": model,
                     "keep_alive": -1,
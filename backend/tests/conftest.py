@@ -0,0 +1,29 @@
+import asyncio
+import os
+import re
+import sys
+
+# Tests import backend modules the way api.py does (utils.x, agents.x)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+class FakeChatModel:
+    """
+    Stands in for ChatOllama: streams a fixed reply word by word, or raises error.
+    """
+
+    def __init__(self, text: str, delay: float = 0.0, error: Exception | None = None):
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.calls = []
+
+    async def astream(self, prompt, **kwargs):
+        from langchain_core.messages import AIMessageChunk
+
+        self.calls.append(kwargs)
+        if self.error is not None:
+            raise self.error
+        for piece in re.findall(r"\S+\s*", self.text):
+            await asyncio.sleep(self.delay)
+            yield AIMessageChunk(content=piece)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("pinecone")
+pytest.importorskip("sentence_transformers")
+httpx = pytest.importorskip("httpx")
+
+import api
+from agents.listener import ListenerAgent
+from agents.mapper import ClinicalMapperAgent
+from conftest import FakeChatModel
+from utils.crisis_screen import CrisisScreen
+from utils.mapper_batcher import MapperBatcher
+from utils.model_scheduler import ModelScheduler
+from utils.overload import OverloadController
+from utils.session_store import create_session_store
+from utils.turn_stream import TurnRegistry
+
+LISTENER_REPLY = "I hear you. That sounds hard. What happened next?"
+MAPPER_PROFILE = json.dumps({
+    "self_harm_indicators": False,
+    "risk_score": 3,
+    "detected_risk": "low",
+    "primary_emotion": "stress",
+    "root_cause_of_the_distress": "Academic failure/Exam stress",
+    "clinical_summary": "The user is stressed about exams.",
+})
+
+
+@pytest.fixture
+def chat_app(tmp_path, monkeypatch):
+    """
+    api.app wired up as the lifespan would, with fake models and state under tmp_path.
+    """
+    listener = ListenerAgent()
+    listener.llm = FakeChatModel(LISTENER_REPLY, delay=0.01)
+    mapper = ClinicalMapperAgent()
+    mapper.llm = FakeChatModel(MAPPER_PROFILE)
+    scheduler = ModelScheduler()
+    monkeypatch.setattr(api, "PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr(api, "listener_agent", listener)
+    monkeypatch.setattr(api, "mapper_agent", mapper)
+    monkeypatch.setattr(api, "model_scheduler", scheduler)
+    monkeypatch.setattr(api, "mapper_batcher", MapperBatcher(mapper, scheduler, window_ms=0))
+    monkeypatch.setattr(api, "overload_controller", OverloadController(scheduler.queued))
+    monkeypatch.setattr(api, "crisis_screen", CrisisScreen.from_file())
+    monkeypatch.setattr(api, "turn_registry", TurnRegistry())
+    monkeypatch.setattr(api, "session_store", create_session_store(str(tmp_path / "sessions.db"), "memory"))
+    return api.app
+
+
+def events(body: str) -> list:
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+
+async def post_chat(client, payload: dict, headers: dict | None = None):
+    response = await client.post("/api/chat", json=payload, headers=headers or {})
+    return response.status_code, response.text
+
+
+def run(app, scenario):
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client)
+    return asyncio.run(main())
+
+
+def test_delta_turn_streams_reply_and_metadata(chat_app):
+    status, body = run(chat_app, lambda client: post_chat(client, {"session_id": "s1", "message": "exams", "turn_seq": 1}))
+
+    assert status == 200
+    received = events(body)
+    assert "".join(e["content"] for e in received if e["type"] == "chunk") == LISTENER_REPLY
+    assert received[-1] == {"type": "metadata", "peer_group_match": None, "crisis_intercept": False, "turn_seq": 1}
+
+
+def test_concurrent_turns_with_same_seq_resync_instead_of_failing(chat_app):
+    async def scenario(client):
+        return await asyncio.gather(
+            post_chat(client, {"session_id": "s2", "message": "exams", "turn_seq": 1}, {"Idempotency-Key": "a"}),
+            post_chat(client, {"session_id": "s2", "message": "exams", "turn_seq": 1}, {"Idempotency-Key": "b"}),
+        )
+
+    results = run(chat_app, scenario)
+
+    finals = sorted((events(body)[-1] for _, body in results), key=lambda e: e["type"])
+    assert [e["type"] for e in finals] == ["error", "metadata"]
+    assert finals[0]["expected_turn_seq"] == 2
+
+
+def test_failed_turn_reports_error_and_retry_runs_again(chat_app):
+    listener = api.listener_agent
+    payload = {"session_id": "s3", "message": "exams", "turn_seq": 1}
+
+    async def scenario(client):
+        listener.llm = FakeChatModel(LISTENER_REPLY, error=ConnectionError("Ollama is unreachable"))
+        failed = await post_chat(client, payload)
+        listener.llm = FakeChatModel(LISTENER_REPLY)
+        retried = await post_chat(client, payload)
+        return failed, retried
+
+    (_, failed_body), (_, retried_body) = run(chat_app, scenario)
+
+    assert events(failed_body)[-1]["type"] == "error"
+    assert events(retried_body)[-1]["type"] == "metadata"
+
+
+def test_different_message_with_same_seq_conflicts(chat_app):
+    async def scenario(client):
+        first = await post_chat(client, {"session_id": "s4", "message": "exams", "turn_seq": 1})
+        repeat = await post_chat(client, {"session_id": "s4", "message": "exams", "turn_seq": 1})
+        other = await client.post("/api/chat", json={"session_id": "s4", "message": "my job", "turn_seq": 1})
+        return first, repeat, other
+
+    first, repeat, other = run(chat_app, scenario)
+
+    # An identical resubmission replays the turn; a different message is a conflict
+    assert repeat == first
+    assert other.status_code == 409
+    assert other.json()["expected_turn_seq"] == 2
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+from utils.crisis_screen import CrisisScreen
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+from eval_crisis_screen import DEFAULT_FIXTURES, MIN_PRECISION, MIN_RECALL, evaluate, load_fixtures
+
+
+@pytest.fixture(scope="module")
+def screen():
+    return CrisisScreen.from_file()
+
+
+def test_fixture_set_meets_precision_and_recall_floors(screen):
+    report = evaluate(screen, load_fixtures(DEFAULT_FIXTURES))
+
+    assert report["precision"] >= MIN_PRECISION
+    assert report["recall"] >= MIN_RECALL
+    # Every miss is a documented one
+    assert [case["text"] for kind, case, _ in report["errors"] if kind != "KNOWN MISS"] == []
+
+
+@pytest.mark.parametrize("text", [
+    "I'm not suicidal, I just feel really lonely",
+    "I have never been suicidal",
+    "I would never kill myself, don't worry",
+    "I was killing myself laughing at that movie",
+    "My friend volunteers for a suicide prevention helpline",
+])
+def test_benign_phrases_do_not_fire(screen, text):
+    assert screen.screen(text)["crisis"] is False
+
+
+@pytest.mark.parametrize("text, language", [
+    ("मैं आत्महत्या के बारे में सोच रहा हूँ", "hi"),
+    ("अब और जीना नहीं चाहती", "hi"),
+    ("yaar main marna chahta hu", "hi-Latn"),
+    ("kabhi kabhi KHUDKUSHI ka khayal aata hai", "hi-Latn"),
+])
+def test_hindi_hits_in_devanagari_and_romanized(screen, text, language):
+    result = screen.screen(text)
+
+    assert result["crisis"] is True
+    assert language in result["languages"]
+
+
+def test_negation_only_cancels_the_phrase_it_covers(screen):
+    result = screen.screen("I'm not suicidal but sometimes I want to die")
+
+    assert result["crisis"] is True
+    assert result["matches"] == ["want to die"]
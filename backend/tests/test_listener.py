@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from agents import listener as listener_module
+from agents.listener import ListenerAgent
+from conftest import FakeChatModel
+
+# Six sentences; the explore phase is capped after four
+REPLY = "One. Two. Three. Four. Five. Six."
+
+
+def stream_reply(agent: ListenerAgent, num_predict: int | None = None) -> str:
+    async def main():
+        text = "".join([chunk async for chunk in agent.agenerate_stream([], "explore", num_predict=num_predict)])
+        # Let a sampled overrun finish
+        await asyncio.gather(*agent._overrun_tasks)
+        return text
+
+    return asyncio.run(main())
+
+
+def test_capped_reply_records_tokens_at_cut_against_num_predict(monkeypatch):
+    monkeypatch.setattr(listener_module, "LISTENER_OVERRUN_SAMPLE_RATE", 0.0)
+    agent = ListenerAgent()
+    agent.llm = FakeChatModel(REPLY)
+
+    assert stream_reply(agent, num_predict=256) == "One. Two. Three. Four."
+    stats = agent.stats()
+
+    assert (stats["stopped_early"], stats["tokens_at_cut"], stats["num_predict_at_cut"]) == (1, 4, 256)
+    assert stats["tokens_saved_upper_bound"] == 252
+    assert stats["tokens_saved_estimate"] is None
+    assert stats["reply_tokens"]["capped"]["le_16"] == 1
+
+
+def test_sampled_overrun_estimates_tokens_saved(monkeypatch):
+    monkeypatch.setattr(listener_module, "LISTENER_OVERRUN_SAMPLE_RATE", 1.0)
+    agent = ListenerAgent()
+    agent.llm = FakeChatModel(REPLY)
+
+    stream_reply(agent)
+    stream_reply(agent)
+    agent.llm = FakeChatModel("Just one.")
+    stream_reply(agent)
+    stats = agent.stats()
+
+    # Each capped reply would have gone on for two more tokens ("Five. Six.")
+    assert (stats["overrun_samples"], stats["overrun_tokens_sampled"]) == (2, 4)
+    assert stats["tokens_saved_estimate"] == 4
+    assert stats["reply_tokens"]["natural"]["le_inf"] == 1
@@ -0,0 +1,143 @@
+import asyncio
+
+from utils.mapper_batcher import MapperBatcher
+from utils.model_scheduler import PRIORITY_CRISIS, PRIORITY_ROUTINE, ModelScheduler
+
+MODEL = "gemma3:4b"
+PROFILE = {"self_harm_indicators": False, "risk_score": 2, "clinical_summary": "Stressed about exams."}
+
+
+class FakeMapper:
+    model_name = MODEL
+
+    def __init__(self, cache: dict | None = None):
+        self.cache = dict(cache or {})
+        self.requests = []
+        self.active = 0
+        self.peak_active = 0
+
+    def cached(self, transcript: str, on_field=None):
+        profile = self.cache.get(transcript)
+        return dict(profile) if profile is not None else None
+
+    async def aanalyze(self, transcript: str, on_field=None, check_cache: bool = True) -> dict:
+        self.requests.append(transcript)
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.active -= 1
+        if on_field:
+            on_field("risk_score", PROFILE["risk_score"])
+        return dict(PROFILE)
+
+
+async def until_queued(scheduler, count: int):
+    while scheduler.lane(MODEL).stats()["queued"] < count:
+        await asyncio.sleep(0.001)
+
+
+def test_cache_hit_does_not_wait_for_a_batch_or_slot():
+    async def main():
+        scheduler = ModelScheduler({MODEL: 1})
+        mapper = FakeMapper(cache={"User: hello": PROFILE})
+        batcher = MapperBatcher(mapper, scheduler, window_ms=1000)
+        async with scheduler.slot(MODEL, "busy-session"):
+            # The only slot is taken and the window is long, yet the cached transcript answers at once
+            return await asyncio.wait_for(batcher.analyze("User: hello", "s1"), timeout=0.5), mapper
+
+    profile, mapper = asyncio.run(main())
+
+    assert profile == PROFILE
+    assert mapper.requests == []
+
+
+def test_window_sends_distinct_transcripts_together_on_one_slot():
+    fields = {}
+
+    async def main():
+        scheduler = ModelScheduler({MODEL: 1})
+        mapper = FakeMapper()
+        batcher = MapperBatcher(mapper, scheduler, window_ms=20, max_batch=8)
+        profiles = await asyncio.gather(*(
+            batcher.analyze(f"User: message {i}", f"s{i}", on_field=lambda k, v, i=i: fields.setdefault(i, k))
+            for i in range(4)
+        ))
+        return profiles, mapper
+
+    profiles, mapper = asyncio.run(main())
+
+    # A lane capped at one slot still ran the whole batch in parallel
+    assert sorted(mapper.requests) == [f"User: message {i}" for i in range(4)]
+    assert mapper.peak_active == 4
+    assert profiles == [PROFILE] * 4
+    assert fields == {i: "risk_score" for i in range(4)}
+
+
+def test_full_batch_is_sent_before_the_window_ends():
+    async def main():
+        mapper = FakeMapper()
+        batcher = MapperBatcher(mapper, ModelScheduler({MODEL: 1}), window_ms=10_000, max_batch=2)
+        return await asyncio.wait_for(asyncio.gather(
+            batcher.analyze("User: a", "s1"), batcher.analyze("User: b", "s2"),
+        ), timeout=1)
+
+    assert asyncio.run(main()) == [PROFILE, PROFILE]
+
+
+def test_identical_transcripts_share_one_request():
+    async def main():
+        mapper = FakeMapper()
+        batcher = MapperBatcher(mapper, ModelScheduler({MODEL: 2}), window_ms=5)
+        profiles = await asyncio.gather(*(batcher.analyze("User: exams", s) for s in ("s1", "s2")))
+        return profiles, mapper
+
+    profiles, mapper = asyncio.run(main())
+
+    assert mapper.requests == ["User: exams"]
+    assert profiles == [PROFILE, PROFILE] and profiles[0] is not profiles[1]
+
+
+def test_crisis_request_skips_the_window_and_escalates_a_queued_batch():
+    async def main():
+        scheduler = ModelScheduler({MODEL: 1})
+        mapper = FakeMapper()
+        batcher = MapperBatcher(mapper, scheduler, window_ms=0)
+        async with scheduler.slot(MODEL, "busy-session"):
+            earlier = asyncio.create_task(batcher.analyze("User: my job", "s1", PRIORITY_ROUTINE))
+            await until_queued(scheduler, 1)
+            shared = asyncio.create_task(batcher.analyze("User: exams", "s2", PRIORITY_ROUTINE))
+            await until_queued(scheduler, 2)
+            crisis = asyncio.create_task(batcher.analyze("User: exams", "s3", PRIORITY_CRISIS))
+            await asyncio.sleep(0)
+        await asyncio.gather(earlier, shared, crisis)
+
+        # With a long window, a crisis request is still sent straight away
+        slow = MapperBatcher(mapper, scheduler, window_ms=10_000)
+        await asyncio.wait_for(slow.analyze("User: help", "s4", PRIORITY_CRISIS), timeout=1)
+        return mapper
+
+    mapper = asyncio.run(main())
+
+    assert mapper.requests == ["User: exams", "User: my job", "User: help"]
+
+
+def test_batch_is_dropped_once_every_waiter_leaves():
+    async def main():
+        scheduler = ModelScheduler({MODEL: 1})
+        mapper = FakeMapper()
+        batcher = MapperBatcher(mapper, scheduler, window_ms=0)
+        async with scheduler.slot(MODEL, "busy-session"):
+            waiters = [asyncio.create_task(batcher.analyze("User: exams", s)) for s in ("s1", "s2")]
+            await until_queued(scheduler, 1)
+            for task in waiters:
+                task.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+            await asyncio.sleep(0)
+            return scheduler.lane(MODEL).stats()["queued"], mapper
+
+    queued, mapper = asyncio.run(main())
+
+    assert queued == 0
+    assert mapper.requests == []
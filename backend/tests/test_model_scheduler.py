@@ -0,0 +1,118 @@
+import asyncio
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from utils.executors import PoolSaturated
+from utils.model_scheduler import PRIORITY_CRISIS, PRIORITY_HIGH_RISK, PRIORITY_ROUTINE, ModelScheduler
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "scripts")))
+from fake_ollama import FakeOllama, make_handler
+
+LISTENER_MODEL = "ministral-3:3b"
+MAPPER_MODEL = "gemma3:4b"
+
+
+@pytest.fixture
+def ollama():
+    """
+    scripts/fake_ollama.py on a free port, serving more requests at once than the scheduler allows.
+    """
+    fake = FakeOllama(parallel=8, first_token_delay=0.05, token_delay=0.001)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fake))
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    fake.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield fake
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def chat(base_url: str, model: str, message: str) -> str:
+    response = requests.post(f"{base_url}/api/chat", json={
+        "model": model, "messages": [{"role": "user", "content": message}], "stream": True,
+    }, stream=True, timeout=10)
+    return "".join(line.decode("utf-8") for line in response.iter_lines() if line)
+
+
+async def scheduled_chat(scheduler, base_url: str, model: str, message: str, session_id: str, priority: int):
+    async with scheduler.slot(model, session_id, priority):
+        return await asyncio.to_thread(chat, base_url, model, message)
+
+
+async def until_queued(scheduler, model: str, count: int):
+    while scheduler.lane(model).stats()["queued"] < count:
+        await asyncio.sleep(0.005)
+
+
+def test_per_model_caps_hold_at_the_server(ollama):
+    async def main():
+        scheduler = ModelScheduler({LISTENER_MODEL: 2, MAPPER_MODEL: 1})
+        await asyncio.gather(*(
+            scheduled_chat(scheduler, ollama.base_url, model, f"{model} {i}", f"s{i}", PRIORITY_ROUTINE)
+            for i in range(6) for model in (LISTENER_MODEL, MAPPER_MODEL)
+        ))
+
+    asyncio.run(main())
+
+    stats = ollama.snapshot()
+    assert stats[LISTENER_MODEL]["requests"] == 6 and stats[LISTENER_MODEL]["peak_active"] == 2
+    assert stats[MAPPER_MODEL]["requests"] == 6 and stats[MAPPER_MODEL]["peak_active"] == 1
+
+
+def test_crisis_and_high_risk_requests_go_first(ollama):
+    async def main():
+        scheduler = ModelScheduler({MAPPER_MODEL: 1})
+        blocker = asyncio.create_task(scheduled_chat(scheduler, ollama.base_url, MAPPER_MODEL, "first", "s0", PRIORITY_ROUTINE))
+        await asyncio.sleep(0.01)
+        queued = []
+        for message, priority in (("routine", PRIORITY_ROUTINE), ("high-risk", PRIORITY_HIGH_RISK), ("crisis", PRIORITY_CRISIS)):
+            queued.append(asyncio.create_task(
+                scheduled_chat(scheduler, ollama.base_url, MAPPER_MODEL, message, message, priority)
+            ))
+            await until_queued(scheduler, MAPPER_MODEL, len(queued))
+        await asyncio.gather(blocker, *queued)
+
+    asyncio.run(main())
+
+    assert [label for _, label in ollama.arrivals] == ["first", "crisis", "high-risk", "routine"]
+
+
+def test_a_session_with_a_request_in_flight_yields_to_other_sessions(ollama):
+    async def main():
+        scheduler = ModelScheduler({LISTENER_MODEL: 2})
+        busy_session = scheduler.slot(LISTENER_MODEL, "a")
+        other_session = scheduler.slot(LISTENER_MODEL, "x")
+        await busy_session.__aenter__()
+        await other_session.__aenter__()
+        # "a" queues first, but it already has a request running and "b" has none
+        second_from_a = asyncio.create_task(scheduled_chat(scheduler, ollama.base_url, LISTENER_MODEL, "a-2", "a", PRIORITY_ROUTINE))
+        await until_queued(scheduler, LISTENER_MODEL, 1)
+        first_from_b = asyncio.create_task(scheduled_chat(scheduler, ollama.base_url, LISTENER_MODEL, "b-1", "b", PRIORITY_ROUTINE))
+        await until_queued(scheduler, LISTENER_MODEL, 2)
+        await other_session.__aexit__(None, None, None)
+        await first_from_b
+        await busy_session.__aexit__(None, None, None)
+        await second_from_a
+
+    asyncio.run(main())
+
+    assert [label for _, label in ollama.arrivals] == ["b-1", "a-2"]
+
+
+def test_full_queue_rejects_new_requests():
+    async def main():
+        scheduler = ModelScheduler({MAPPER_MODEL: 1}, max_queue=1)
+        async with scheduler.slot(MAPPER_MODEL, "s1"):
+            waiting = asyncio.create_task(scheduler.run(MAPPER_MODEL, asyncio.sleep(0), "s2"))
+            await until_queued(scheduler, MAPPER_MODEL, 1)
+            with pytest.raises(PoolSaturated):
+                await scheduler.run(MAPPER_MODEL, asyncio.sleep(0), "s3")
+        await waiting
+
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+
+from utils.peer_index import (
+    BUILDS_DIR,
+    EMBEDDINGS_FILE,
+    MANIFEST_FILE,
+    SIDECAR_FILE,
+    LocalPeerIndex,
+    new_build_dir,
+    publish_build,
+    source_file_hash,
+)
+
+MODEL = "bert-base-nli-mean-tokens"
+
+
+def write_build(index_dir, name: str, peer_ids: list, source: str | None = None) -> str:
+    """
+    Writes a build the way scripts/build_peer_index.py does, without an encoder.
+    """
+    build_dir = new_build_dir(str(index_dir), name)
+    matrix = np.eye(len(peer_ids), 4, dtype=np.float32)
+    np.save(os.path.join(build_dir, EMBEDDINGS_FILE), matrix)
+    with open(os.path.join(build_dir, SIDECAR_FILE), "w", encoding="utf-8") as f:
+        for peer_id in peer_ids:
+            f.write(json.dumps({"peer_id": peer_id, "content_hash": peer_id, "metadata": {"name": peer_id}}) + "\n")
+    manifest = {"model": MODEL, "dim": 4, "dtype": "float32", "count": len(peer_ids), "index_version": name}
+    if source:
+        manifest.update({"source": source, "source_hash": source_file_hash(source)})
+    with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return build_dir
+
+
+def test_nothing_loads_until_a_build_is_published(tmp_path):
+    write_build(tmp_path, "v1", ["p1"])
+
+    assert LocalPeerIndex.load(str(tmp_path)) is None
+
+
+def test_load_sees_one_whole_build_and_old_builds_are_pruned(tmp_path):
+    publish_build(str(tmp_path), write_build(tmp_path, "v1", ["p1"]))
+    old = LocalPeerIndex.load(str(tmp_path), expected_model=MODEL)
+    # The next build is fully written before the pointer moves
+    v2 = write_build(tmp_path, "v2", ["p1", "p2"])
+    assert LocalPeerIndex.load(str(tmp_path)).version == "v1"
+    publish_build(str(tmp_path), v2)
+    publish_build(str(tmp_path), write_build(tmp_path, "v3", ["p1", "p2", "p3"]))
+
+    index = LocalPeerIndex.load(str(tmp_path), expected_model=MODEL)
+
+    assert (old.version, old.ids) == ("v1", ["p1"])
+    assert (index.version, index.ids, index.matrix.shape[0]) == ("v3", ["p1", "p2", "p3"], 3)
+    assert sorted(os.listdir(tmp_path / BUILDS_DIR)) == ["v2", "v3"]
+
+
+def test_load_warns_when_the_source_changed_since_the_build(tmp_path, capsys):
+    source = tmp_path / "peers.json"
+    source.write_text(json.dumps([{"peer_id": "p1"}]), encoding="utf-8")
+    publish_build(str(tmp_path), write_build(tmp_path, "v1", ["p1"], source=str(source)))
+
+    LocalPeerIndex.load(str(tmp_path), source_path=str(source))
+    assert "WARN" not in capsys.readouterr().out
+
+    source.write_text(json.dumps([{"peer_id": "p1"}, {"peer_id": "p2"}]), encoding="utf-8")
+    LocalPeerIndex.load(str(tmp_path), source_path=str(source))
+    assert "changed since peer index v1" in capsys.readouterr().out
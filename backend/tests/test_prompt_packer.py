@@ -0,0 +1,40 @@
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from agents import prompt_packer
+from agents.prompt_packer import PromptPacker, estimate_tokens
+
+
+@pytest.fixture
+def tokenizer_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(prompt_packer, "PROMPT_TOKENIZER_DIR", str(tmp_path))
+    monkeypatch.setattr(prompt_packer, "_tokenizers", {})
+    return tmp_path
+
+
+def test_missing_tokenizer_file_falls_back_to_the_estimate_and_says_so(tokenizer_dir, capsys):
+    packer = PromptPacker("listener", 256, model="ministral-3:3b")
+    PromptPacker("mapper", 256, model="ministral-3:3b")
+
+    assert packer.count("I can't sleep before exams") == estimate_tokens("I can't sleep before exams")
+    stats = packer.stats()
+    assert stats["tokenizer"] == "estimate"
+    assert stats["estimated_counts"] == 1
+    # One warning per model, not per packer or per count
+    assert capsys.readouterr().out.count("[PROMPT PACKER WARN]") == 1
+
+
+def test_local_tokenizer_file_is_used_per_model(tokenizer_dir):
+    tokenizers = pytest.importorskip("tokenizers")
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel({"[UNK]": 0, "exams": 1}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(tokenizer_dir / "gemma3_4b.json"))
+
+    packer = PromptPacker("mapper", 64, model="gemma3:4b")
+    packed = packer.pack_messages(SystemMessage(content="one two"), [HumanMessage(content="exams " * 10)])
+
+    assert packer.count("exams " * 10) == 10
+    assert len(packed) == 2
+    stats = packer.stats()
+    assert stats["tokenizer"] == str(tokenizer_dir / "gemma3_4b.json")
+    assert stats["estimated_counts"] == 0
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("langchain_community")
+pytest.importorskip("pinecone")
+pytest.importorskip("sentence_transformers")
+httpx = pytest.importorskip("httpx")
+
+import api
+from utils.appointment_store import AppointmentStore
+from utils.peer_directory import PeerDirectory
+
+SLOT = "2026-03-16T19:30:00+05:30"
+
+
+@pytest.fixture
+def schedule_app(tmp_path, monkeypatch):
+    peers = tmp_path / "peers.json"
+    peers.write_text(json.dumps([
+        {"peer_id": "peer_001", "availability": [{"start_time": SLOT}, {"start_time": "2026-03-18T18:30:00+05:30"}]},
+    ]), encoding="utf-8")
+    store = AppointmentStore(str(tmp_path / "appointments.db"))
+    monkeypatch.setattr(api, "peer_directory", PeerDirectory(str(peers)))
+    monkeypatch.setattr(api, "appointment_store", store)
+    return store
+
+
+def schedule(session_id: str, selected_slot: str, peer_id: str = "peer_001"):
+    async def main():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/schedule", json={
+                "session_id": session_id, "peer_id": peer_id, "selected_slot": selected_slot,
+            })
+
+    return asyncio.run(main())
+
+
+def test_slot_the_peer_does_not_offer_is_rejected(schedule_app):
+    response = schedule("s1", "2026-03-17T09:00:00+05:30")
+
+    assert response.status_code == 400
+    assert schedule_app.for_peer("peer_001") == []
+
+
+def test_slot_is_matched_by_time_and_booked_once(schedule_app):
+    # The same instant written in UTC books the peer's listed slot
+    first = schedule("s1", "2026-03-16T14:00:00+00:00")
+    second = schedule("s2", SLOT)
+
+    assert first.json() == {"status": "success"}
+    assert second.status_code == 409
+    assert [(a["session_id"], a["selected_slot"]) for a in schedule_app.for_peer("peer_001")] == [("s1", SLOT)]
+
+
+def test_migrated_legacy_booking_blocks_the_same_slot(tmp_path, monkeypatch):
+    peers = tmp_path / "peers.json"
+    peers.write_text(json.dumps([
+        {"peer_id": "peer_001", "availability": [{"start_time": SLOT}]},
+    ]), encoding="utf-8")
+    legacy = tmp_path / "appointments.json"
+    # Old frontends stored the slot as typed, without seconds, in UTC
+    legacy.write_text(json.dumps([
+        {"session_id": "old", "peer_id": "peer_001", "selected_slot": "2026-03-16T14:00Z",
+         "created_at": "2026-03-15T12:10:27"},
+    ]), encoding="utf-8")
+    directory = PeerDirectory(str(peers))
+    store = AppointmentStore(str(tmp_path / "appointments.db"), str(legacy), slot_resolver=directory.listed_slot)
+    monkeypatch.setattr(api, "peer_directory", directory)
+    monkeypatch.setattr(api, "appointment_store", store)
+
+    response = schedule("s1", SLOT)
+
+    assert response.status_code == 409
+    assert [(a["session_id"], a["selected_slot"]) for a in store.for_peer("peer_001")] == [("old", SLOT)]
@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+from utils.session_log import SessionLogWriter, read_session_log
+
+
+def test_sync_aappend_writes_in_a_worker_thread(tmp_path, monkeypatch):
+    writer = SessionLogWriter(durability="sync")
+    threads = []
+    write_inline = writer._write_inline
+
+    def recording_write(path, line):
+        threads.append(threading.current_thread())
+        write_inline(path, line)
+
+    monkeypatch.setattr(writer, "_write_inline", recording_write)
+    path = str(tmp_path / "session.jsonl")
+
+    asyncio.run(writer.aappend(path, {"user_input": "hi"}))
+
+    assert read_session_log(path) == [{"user_input": "hi"}]
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_full_queue_falls_back_to_an_inline_write_off_the_loop(tmp_path):
+    writer = SessionLogWriter(durability="async", flush_interval=60, max_queue=1)
+    path = str(tmp_path / "session.jsonl")
+
+    async def main():
+        # The writer thread is parked collecting its first batch, so the queue fills up
+        for i in range(4):
+            await writer.aappend(path, {"turn": i})
+
+    asyncio.run(main())
+    writer.close()
+
+    assert sorted(turn["turn"] for turn in read_session_log(path)) == [0, 1, 2, 3]
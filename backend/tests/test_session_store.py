@@ -0,0 +1,37 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.session_store import SessionBackend, SessionBusy, create_session_store
+
+
+def test_backend_interface_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        SessionBackend()
+
+
+def test_sqlite_alock_takes_and_releases_off_the_event_loop(tmp_path, monkeypatch):
+    store = create_session_store(str(tmp_path / "sessions.db"), "sqlite")
+    threads = []
+    release = store.release
+
+    def recording_release(session_id, token):
+        threads.append(threading.current_thread())
+        release(session_id, token)
+
+    monkeypatch.setattr(store, "release", recording_release)
+
+    async def main():
+        async with store.alock("s1"):
+            # A second turn of the same session cannot get in meanwhile
+            with pytest.raises(SessionBusy):
+                async with store.alock("s1", timeout=0.05):
+                    pass
+        async with store.alock("s1", timeout=0.5):
+            pass
+
+    asyncio.run(main())
+
+    assert len(threads) == 2
+    assert all(thread is not threading.main_thread() for thread in threads)
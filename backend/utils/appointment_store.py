@@ -0,0 +1,160 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+# FULL fsyncs every booking commit; NORMAL is still crash-safe in WAL mode but may lose the
+# last commits on power loss.
+APPOINTMENT_DB_SYNCHRONOUS = os.getenv("APPOINTMENT_DB_SYNCHRONOUS", "FULL").strip().upper()
+
+
+class SlotAlreadyBooked(Exception):
+    pass
+
+
+class AppointmentStore:
+    """
+    SQLite (WAL mode) appointment table. Bookings are single-row inserts inside an IMMEDIATE
+    transaction, so their cost does not grow with history and concurrent bookings for the same
+    peer/slot serialize instead of overwriting each other.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: str | None = None, slot_resolver=None):
+        # slot_resolver(peer_id, selected_slot) -> the peer's listed start_time or None
+        # (PeerDirectory.listed_slot); used to bring imported slots into the form book() stores
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS appointments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                peer_id TEXT NOT NULL,
+                selected_slot TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_appointments_peer_slot ON appointments (peer_id, selected_slot);
+            CREATE INDEX IF NOT EXISTS idx_appointments_slot ON appointments (selected_slot);
+            CREATE TABLE IF NOT EXISTS store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+        if legacy_json_path:
+            self._migrate_legacy_json(legacy_json_path)
+        if slot_resolver:
+            self._normalize_slots(slot_resolver)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; autocommit mode so transactions are explicit
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA synchronous={APPOINTMENT_DB_SYNCHRONOUS}")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_legacy_json(self, legacy_json_path: str):
+        """
+        One-time import of the old data/appointments.json array. The JSON file is left untouched.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute("SELECT 1 FROM store_meta WHERE key = 'legacy_json_migrated'").fetchone()
+            if done is None:
+                records = []
+                if os.path.exists(legacy_json_path):
+                    with open(legacy_json_path, "r", encoding="utf-8") as f:
+                        records = json.load(f)
+                # Historical rows are imported as-is, including any double bookings made before this store existed
+                conn.executemany(
+                    "INSERT INTO appointments (session_id, peer_id, selected_slot, created_at) VALUES (?, ?, ?, ?)",
+                    [(r.get("session_id", ""), r.get("peer_id", ""), r.get("selected_slot", ""), r.get("created_at", "")) for r in records],
+                )
+                conn.execute(
+                    "INSERT INTO store_meta (key, value) VALUES ('legacy_json_migrated', ?)",
+                    (datetime.datetime.now().isoformat(),),
+                )
+                print(f"[APPOINTMENTS]: Migrated {len(records)} appointments from {legacy_json_path}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _normalize_slots(self, slot_resolver):
+        """
+        One-time rewrite of stored slots (e.g. legacy "2026-03-16T12:10") to the peer's listed
+        start_time, so exact-string lookups in book() and the availability filter see them.
+        Slots the peer no longer lists are left as they are.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            done = conn.execute("SELECT 1 FROM store_meta WHERE key = 'slots_normalized'").fetchone()
+            if done is None:
+                updates = []
+                for row in conn.execute("SELECT id, peer_id, selected_slot FROM appointments").fetchall():
+                    listed = slot_resolver(row["peer_id"], row["selected_slot"])
+                    if listed and listed != row["selected_slot"]:
+                        updates.append((listed, row["id"]))
+                conn.executemany("UPDATE appointments SET selected_slot = ? WHERE id = ?", updates)
+                conn.execute(
+                    "INSERT INTO store_meta (key, value) VALUES ('slots_normalized', ?)",
+                    (datetime.datetime.now().isoformat(),),
+                )
+                if updates:
+                    print(f"[APPOINTMENTS]: Matched {len(updates)} stored slots to the peers' listed start times")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def book(self, session_id: str, peer_id: str, selected_slot: str) -> dict:
+        """
+        Books a peer/slot. A retry from the session that already holds the slot returns the
+        existing booking; a different session gets SlotAlreadyBooked.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = conn.execute(
+                "SELECT * FROM appointments WHERE peer_id = ? AND selected_slot = ? ORDER BY id LIMIT 1",
+                (peer_id, selected_slot),
+            ).fetchone()
+            if existing is not None:
+                conn.execute("ROLLBACK")
+                if existing["session_id"] == session_id:
+                    return dict(existing)
+                raise SlotAlreadyBooked(f"{peer_id} is already booked at {selected_slot}.")
+
+            record = {
+                "session_id": session_id,
+                "peer_id": peer_id,
+                "selected_slot": selected_slot,
+                "created_at": datetime.datetime.now().isoformat(),
+            }
+            cursor = conn.execute(
+                "INSERT INTO appointments (session_id, peer_id, selected_slot, created_at) VALUES (?, ?, ?, ?)",
+                (record["session_id"], record["peer_id"], record["selected_slot"], record["created_at"]),
+            )
+            conn.execute("COMMIT")
+            record["id"] = cursor.lastrowid
+            return record
+        except SlotAlreadyBooked:
+            raise
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def for_peer(self, peer_id: str) -> list:
+        rows = self._conn().execute(
+            "SELECT * FROM appointments WHERE peer_id = ? ORDER BY selected_slot", (peer_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
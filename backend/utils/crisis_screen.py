@@ -0,0 +1,145 @@
+import json
+import os
+import time
+import unicodedata
+from collections import deque
+
+from .metrics import METRICS
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Curated self-harm phrases per language, plus benign phrases that cancel a match they contain
+CRISIS_PHRASES_FILE = os.getenv("CRISIS_PHRASES_FILE", os.path.join(PROJECT_ROOT, "data", "crisis_phrases.json"))
+
+_APOSTROPHES = {"'", "’", "‘", "`"}
+# The screen is expected to take well under a millisecond
+SCREEN_SECONDS_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Casefolds and strips punctuation so phrases match on word boundaries in any script:
+    letters, combining marks and digits are kept, everything else becomes a single space,
+    and apostrophes are dropped ("don't" -> "dont"). The result is padded with spaces.
+    """
+    chars = []
+    for ch in unicodedata.normalize("NFKC", text).casefold():
+        if ch in _APOSTROPHES:
+            continue
+        if unicodedata.category(ch)[0] in "LMN":
+            chars.append(ch)
+        elif chars and chars[-1] != " ":
+            chars.append(" ")
+    return " " + "".join(chars).strip() + " "
+
+
+def _phrase_pattern(phrase: str) -> str:
+    # A trailing "*" matches the phrase as a prefix, for inflected or agglutinated forms
+    if phrase.endswith("*"):
+        return normalize_text(phrase[:-1]).rstrip(" ")
+    return normalize_text(phrase)
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher: one pass over the text finds every occurrence of every
+    pattern, however many patterns there are.
+    """
+
+    def __init__(self, patterns: list):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self.patterns = list(patterns)
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(index)
+
+        # Breadth-first failure links; each node inherits the outputs of its failure target
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text: str) -> list:
+        """
+        Returns (start, end, pattern_index) for every match, in order of their end position.
+        """
+        matches = []
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for position, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in out[node]:
+                matches.append((position + 1 - len(self.patterns[index]), position + 1, index))
+        return matches
+
+
+class CrisisScreen:
+    """
+    Lexical self-harm pre-screen that runs on the user message before any model call. A hit
+    only steers the current turn (the listener switches to the crisis phase); the mapper's
+    profile still decides crisis routing.
+    """
+
+    def __init__(self, phrases: dict, benign: list | None = None, version=None):
+        self.version = version
+        patterns, self._labels = [], []
+        for language, entries in phrases.items():
+            for phrase in entries:
+                patterns.append(_phrase_pattern(phrase))
+                self._labels.append(("crisis", language, phrase))
+        for phrase in benign or []:
+            patterns.append(_phrase_pattern(phrase))
+            self._labels.append(("benign", None, phrase))
+        self._matcher = AhoCorasick(patterns)
+
+    @classmethod
+    def from_file(cls, path: str = CRISIS_PHRASES_FILE) -> "CrisisScreen":
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        screen = cls(spec.get("phrases", {}), spec.get("benign", []), spec.get("version"))
+        print(f"[CRISIS SCREEN]: Loaded {len(screen._labels)} phrases from {path}")
+        return screen
+
+    def screen(self, text: str) -> dict:
+        """
+        Returns {"crisis": bool, "matches": [phrase, ...], "languages": [...]}.
+        """
+        started = time.perf_counter()
+        found = self._matcher.search(normalize_text(text or ""))
+        benign_spans = [(start, end) for start, end, index in found if self._labels[index][0] == "benign"]
+
+        matches, languages = [], []
+        for start, end, index in found:
+            kind, language, phrase = self._labels[index]
+            if kind != "crisis":
+                continue
+            if any(b_start <= start and end <= b_end for b_start, b_end in benign_spans):
+                continue
+            if phrase not in matches:
+                matches.append(phrase)
+            if language not in languages:
+                languages.append(language)
+
+        METRICS.observe("crisis_screen.seconds", time.perf_counter() - started, SCREEN_SECONDS_BUCKETS)
+        if matches:
+            METRICS.incr("crisis_screen.hits")
+        return {"crisis": bool(matches), "matches": matches, "languages": languages}
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import METRICS
+
+# Worker threads and extra queued tasks allowed per pool before submissions are rejected
+POOL_SIZES = {
+    "mapper": (int(os.getenv("MAPPER_POOL_WORKERS", "4")), int(os.getenv("MAPPER_POOL_QUEUE", "16"))),
+    "matchmaker": (int(os.getenv("MATCHMAKER_POOL_WORKERS", "2")), int(os.getenv("MATCHMAKER_POOL_QUEUE", "16"))),
+    "voice": (int(os.getenv("VOICE_POOL_WORKERS", "4")), int(os.getenv("VOICE_POOL_QUEUE", "32"))),
+}
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    A fixed-size thread pool that refuses work once max_workers + max_queue tasks are in flight,
+    instead of queueing without limit. Records queue wait and execution time per pool.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._count_lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    def _update_gauges(self):
+        METRICS.set_gauge(f"executor.{self.name}.queued", self._queued)
+        METRICS.set_gauge(f"executor.{self.name}.running", self._running)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            METRICS.incr(f"executor.{self.name}.rejected")
+            raise PoolSaturated(f"The {self.name} pool is saturated ({self.max_workers} running, {self.max_queue} queued).")
+
+        submitted = time.monotonic()
+        with self._count_lock:
+            self._queued += 1
+            self._update_gauges()
+
+        def run():
+            started = time.monotonic()
+            with self._count_lock:
+                self._queued -= 1
+                self._running += 1
+                self._update_gauges()
+            METRICS.observe(f"executor.{self.name}.queue_wait_seconds", started - submitted)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                METRICS.observe(f"executor.{self.name}.run_seconds", time.monotonic() - started)
+                with self._count_lock:
+                    self._running -= 1
+                    self._update_gauges()
+
+        try:
+            future = self._pool.submit(run)
+        except Exception:
+            with self._count_lock:
+                self._queued -= 1
+                self._update_gauges()
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_EXECUTORS: dict = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """
+    Returns the process-wide pool for name, creating it on first use.
+    """
+    executor = _EXECUTORS.get(name)
+    if executor is None:
+        with _EXECUTORS_LOCK:
+            executor = _EXECUTORS.get(name)
+            if executor is None:
+                max_workers, max_queue = POOL_SIZES[name]
+                executor = _EXECUTORS[name] = BoundedExecutor(name, max_workers, max_queue)
+    return executor
+
+
+def create_executors(names=None):
+    """
+    Creates the named pools up front (all of POOL_SIZES by default).
+    """
+    for name in names or POOL_SIZES:
+        get_executor(name)
+
+
+def shutdown_executors(wait: bool = True):
+    with _EXECUTORS_LOCK:
+        executors = list(_EXECUTORS.values())
+        _EXECUTORS.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import time
+
+from .metrics import METRICS
+from .model_scheduler import PRIORITY_CRISIS, PRIORITY_ROUTINE
+
+# How long the first pending transcript waits for others to join its batch
+MAPPER_BATCH_WINDOW_MS = float(os.getenv("MAPPER_BATCH_WINDOW_MS", "20"))
+# A batch is dispatched early once it holds this many distinct transcripts; match it to
+# OLLAMA_NUM_PARALLEL so a batch fills the server's parallel slots for the mapper model
+MAPPER_BATCH_MAX = int(os.getenv("MAPPER_BATCH_MAX", "4"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class _Pending:
+    """
+    One distinct transcript and everyone waiting for its profile.
+    """
+
+    def __init__(self, transcript: str, session_id: str, priority: int):
+        self.transcript = transcript
+        self.session_id = session_id
+        self.priority = priority
+        self.created = time.monotonic()
+        self.waiters = []
+        self.fields = {}
+        self.batch = None
+        self.task = None
+
+    def join(self, future, on_field):
+        self.waiters.append((future, on_field))
+        if on_field:
+            # Late joiners still see the fields that already streamed in
+            for key, value in self.fields.items():
+                on_field(key, value)
+
+    def publish(self, key, value):
+        self.fields[key] = value
+        for _, on_field in list(self.waiters):
+            if on_field:
+                on_field(key, value)
+
+    def settle(self, profile=None, error=None):
+        for future, _ in self.waiters:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                # Each waiter gets its own copy, since callers annotate their profile
+                future.set_result(dict(profile))
+
+
+class _Batch:
+    """
+    Transcripts collected in one window. The batch waits for a single slot of the mapper lane,
+    queued at its most urgent member's priority, and then sends all of them to Ollama at once.
+    """
+
+    def __init__(self, members: list):
+        self.members = members
+        self.priority = min(p.priority for p in members)
+        # Fairness is accounted to the session that opened the batch
+        self.session_id = members[0].session_id
+        self.task = None
+
+
+class MapperBatcher:
+    """
+    Collects mapper requests from concurrent sessions for up to window_ms (or max_batch distinct
+    transcripts) and sends each batch through the model scheduler as one admission, so its
+    requests reach Ollama together and run in its parallel slots instead of one after another.
+    Identical transcripts, pending or in flight, share one request; a crisis request flushes the
+    window at once and lifts a queued batch to crisis priority.
+    """
+
+    def __init__(self, mapper, scheduler, window_ms: float = MAPPER_BATCH_WINDOW_MS,
+                 max_batch: int = MAPPER_BATCH_MAX):
+        self.mapper = mapper
+        self.scheduler = scheduler
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._collecting = []
+        self._by_transcript = {}
+        self._flush_handle = None
+
+    async def analyze(self, transcript: str, session_id: str, priority: int = PRIORITY_ROUTINE,
+                      on_field=None) -> dict:
+        """
+        Same result as mapper.aanalyze(transcript, on_field), produced by a shared batch.
+        """
+        # A cache hit never waits for a batch or a model slot
+        profile = self.mapper.cached(transcript, on_field)
+        if profile is not None:
+            return profile
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._by_transcript.get(transcript)
+        if pending is None:
+            pending = self._by_transcript[transcript] = _Pending(transcript, session_id, priority)
+            self._collecting.append(pending)
+        else:
+            METRICS.incr("mapper.batch.deduplicated")
+            self._escalate(pending, priority)
+        pending.join(future, on_field)
+
+        if pending.batch is None:
+            if priority == PRIORITY_CRISIS or len(self._collecting) >= self.max_batch or self.window_ms <= 0:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window_ms / 1000, self._flush)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._leave(pending, future)
+            raise
+
+    def _escalate(self, pending: _Pending, priority: int):
+        pending.priority = min(pending.priority, priority)
+        batch = pending.batch
+        if batch is not None and priority < batch.priority:
+            batch.priority = priority
+            # Only has an effect while the batch is still queued for its slot
+            self.scheduler.escalate(self.mapper.model_name, batch, priority)
+
+    def _leave(self, pending: _Pending, future):
+        pending.waiters = [(f, cb) for f, cb in pending.waiters if f is not future]
+        if pending.waiters:
+            return
+        # Nobody wants this profile any more: drop it from its batch or abort its request
+        self._forget(pending)
+        batch = pending.batch
+        if batch is None:
+            self._collecting.remove(pending)
+        elif pending.task is not None:
+            pending.task.cancel()
+        else:
+            batch.members.remove(pending)
+            if not batch.members:
+                batch.task.cancel()
+
+    def _forget(self, pending: _Pending):
+        if self._by_transcript.get(pending.transcript) is pending:
+            del self._by_transcript[pending.transcript]
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        members, self._collecting = self._collecting, []
+        if not members:
+            return
+        now = time.monotonic()
+        batch = _Batch(members)
+        for pending in members:
+            pending.batch = batch
+            METRICS.observe("mapper.batch.window_wait_seconds", now - pending.created)
+        METRICS.incr("mapper.batch.batches")
+        METRICS.observe("mapper.batch.size", len(members), BATCH_SIZE_BUCKETS)
+        batch.task = asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: _Batch):
+        try:
+            async with self.scheduler.slot(self.mapper.model_name, batch.session_id, batch.priority, token=batch):
+                for pending in batch.members:
+                    pending.task = asyncio.create_task(self._run(pending))
+                await asyncio.gather(*(p.task for p in batch.members), return_exceptions=True)
+        except asyncio.CancelledError:
+            for pending in batch.members:
+                if pending.task is not None:
+                    pending.task.cancel()
+                for future, _ in pending.waiters:
+                    future.cancel()
+                self._forget(pending)
+            raise
+        except Exception as e:
+            # e.g. PoolSaturated: the whole batch was refused a slot
+            for pending in batch.members:
+                pending.settle(error=e)
+                self._forget(pending)
+
+    async def _run(self, pending: _Pending):
+        METRICS.incr("mapper.batch.dispatched")
+        try:
+            profile = await self.mapper.aanalyze(pending.transcript, on_field=pending.publish, check_cache=False)
+        except asyncio.CancelledError:
+            for future, _ in pending.waiters:
+                future.cancel()
+            raise
+        except Exception as e:
+            pending.settle(error=e)
+        else:
+            pending.settle(profile)
+        finally:
+            self._forget(pending)
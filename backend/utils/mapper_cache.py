@@ -0,0 +1,111 @@
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from .metrics import METRICS
+
+# Profiles kept in memory; least recently used ones are dropped first
+MAPPER_CACHE_SIZE = int(os.getenv("MAPPER_CACHE_SIZE", "512"))
+# Optional SQLite file that keeps cached profiles across restarts (empty = memory only)
+MAPPER_CACHE_DB = os.getenv("MAPPER_CACHE_DB", "")
+
+
+def normalize_transcript(transcript: str) -> str:
+    """
+    Canonical form used for cache keys: NFC, trimmed lines, runs of whitespace collapsed,
+    blank lines dropped.
+    """
+    lines = (" ".join(line.split()) for line in unicodedata.normalize("NFC", transcript or "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def mapper_cache_key(transcript: str, model: str, prompt_version: str) -> str:
+    payload = "\x1f".join((model, prompt_version, normalize_transcript(transcript)))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MapperCache:
+    """
+    Content-addressed LRU of mapper profiles. The mapper runs at temperature 0, so an identical
+    transcript for the same model and prompt version always maps to the same profile; retries,
+    resent histories and Streamlit reruns reuse it instead of running the model again.
+    """
+
+    def __init__(self, max_entries: int = MAPPER_CACHE_SIZE, db_path: str = MAPPER_CACHE_DB):
+        self.max_entries = max_entries
+        self.db_path = db_path or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._db = None
+        if self.db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS mapper_cache (
+                    key TEXT PRIMARY KEY,
+                    profile TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    def key(self, transcript: str, model: str, prompt_version: str) -> str:
+        return mapper_cache_key(transcript, model, prompt_version)
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            profile = self._entries.get(key)
+            if profile is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT profile FROM mapper_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    profile = json.loads(row[0])
+                    self._remember(key, profile)
+                    METRICS.incr("mapper_cache.disk_hits")
+
+            if profile is None:
+                self._misses += 1
+                METRICS.incr("mapper_cache.misses")
+                return None
+            self._hits += 1
+            METRICS.incr("mapper_cache.hits")
+            # Callers mutate profiles (root-cause locking), so never hand out the cached object
+            return copy.deepcopy(profile)
+
+    def put(self, key: str, profile: dict):
+        profile = copy.deepcopy(profile)
+        with self._lock:
+            self._remember(key, profile)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO mapper_cache (key, profile, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(profile, ensure_ascii=False), time.time()),
+                )
+
+    def _remember(self, key: str, profile: dict):
+        self._entries[key] = profile
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        METRICS.set_gauge("mapper_cache.entries", len(self._entries))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
@@ -0,0 +1,81 @@
+import os
+import re
+
+from .metrics import METRICS
+
+# The mapper runs on every one of the first N turns of a session
+MAPPER_EARLY_TURNS = int(os.getenv("MAPPER_EARLY_TURNS", "3"))
+# Once the session is stable, it runs at least every Nth turn
+MAPPER_STABLE_EVERY = int(os.getenv("MAPPER_STABLE_EVERY", "3"))
+# Fresh risk scores that must agree before a session counts as stable
+MAPPER_STABLE_WINDOW = int(os.getenv("MAPPER_STABLE_WINDOW", "2"))
+# Sessions whose last risk score is at or above this are analyzed every turn
+MAPPER_ALWAYS_RUN_RISK = int(os.getenv("MAPPER_ALWAYS_RUN_RISK", "7"))
+# Share of a message's terms that must have appeared in the last analyzed transcript
+MAPPER_TOPIC_OVERLAP = float(os.getenv("MAPPER_TOPIC_OVERLAP", "0.2"))
+# While shedding load, low-risk sessions only refresh for soft reasons every Nth turn
+MAPPER_SHED_EVERY = int(os.getenv("MAPPER_SHED_EVERY", "6"))
+
+# Reasons to run that can wait while the server is overloaded
+_SHEDDABLE_REASONS = {"root_cause_open", "risk_unsettled", "topic_shift", "periodic"}
+
+_TERM_RE = re.compile(r"\w{4,}")
+
+
+def topic_terms(text: str) -> set:
+    # Words of four or more characters are a cheap stand-in for content words in any script
+    return {term.casefold() for term in _TERM_RE.findall(text or "")}
+
+
+def is_topic_shift(session: dict, user_input: str) -> bool:
+    terms = topic_terms(user_input)
+    reference = set(session.get("profile_terms") or [])
+    if len(terms) < 3 or not reference:
+        return False
+    return len(terms & reference) / len(terms) < MAPPER_TOPIC_OVERLAP
+
+
+def mapper_decision(session: dict, turn_number: int, user_input: str, prescreen_hit: bool,
+                    shed: bool = False) -> tuple:
+    """
+    Decides whether this turn needs a fresh mapper analysis. Returns (run, reason).
+    Early disclosure, rising or high risk, a lexical crisis hit, an unlocked root cause and a
+    topic shift always run it; a stable session only refreshes every MAPPER_STABLE_EVERY turns.
+    With shed set (overload), the softer of those reasons wait up to MAPPER_SHED_EVERY turns.
+    """
+    risks = session.get("risk_history") or []
+    if prescreen_hit:
+        decision = (True, "crisis_prescreen")
+    elif turn_number <= MAPPER_EARLY_TURNS:
+        decision = (True, "early_disclosure")
+    elif not session.get("last_profile") or not risks:
+        decision = (True, "no_profile")
+    elif risks[-1] >= MAPPER_ALWAYS_RUN_RISK:
+        decision = (True, "high_risk")
+    elif len(risks) >= 2 and risks[-1] > risks[-2]:
+        decision = (True, "risk_rising")
+    elif session.get("session_root_cause", "-") == "-":
+        decision = (True, "root_cause_open")
+    elif len(risks) < MAPPER_STABLE_WINDOW or len(set(risks[-MAPPER_STABLE_WINDOW:])) > 1:
+        decision = (True, "risk_unsettled")
+    elif is_topic_shift(session, user_input):
+        decision = (True, "topic_shift")
+    elif turn_number - session.get("profile_turn", 0) >= MAPPER_STABLE_EVERY:
+        decision = (True, "periodic")
+    else:
+        decision = (False, "stable")
+    if shed and decision[1] in _SHEDDABLE_REASONS and turn_number - session.get("profile_turn", 0) < MAPPER_SHED_EVERY:
+        decision = (False, "overload")
+
+    METRICS.incr(f"mapper.cadence.{'run' if decision[0] else 'skip'}.{decision[1]}")
+    return decision
+
+
+def record_mapper_profile(session: dict, profile: dict, transcript: str):
+    """
+    Remembers what a fresh analysis saw, for the next turns' decisions.
+    """
+    risk_score = profile.get("risk_score", 1)
+    if isinstance(risk_score, (int, float)) and not isinstance(risk_score, bool):
+        session["risk_history"] = ((session.get("risk_history") or []) + [risk_score])[-4:]
+    session["profile_terms"] = sorted(topic_terms(transcript))
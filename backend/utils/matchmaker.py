@@ -1,35 +1,119 @@
 import os
+import copy
+import json
+import threading
+from collections import OrderedDict
 from pinecone import Pinecone
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
+from .metrics import METRICS
+from .peer_index import LocalPeerIndex, read_index_files
+
 load_dotenv()
 
 # Constants
 EMBEDDING_MODEL = "bert-base-nli-mean-tokens"
 INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "mental-health-peers")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# "pinecone" queries the hosted index, "local" searches an in-process NumPy matrix
+PEER_INDEX_BACKEND = os.getenv("PEER_INDEX_BACKEND", "pinecone").strip().lower()
+PEER_INDEX_DTYPE = os.getenv("PEER_INDEX_DTYPE", "float32").strip().lower()
+PEERS_FILE = os.getenv("PEERS_FILE", os.path.join(PROJECT_ROOT, "data", "peers.json"))
+# Prebuilt, memory-mapped index written by backend/scripts/build_peer_index.py
+PEER_INDEX_DIR = os.getenv("PEER_INDEX_DIR", os.path.join(PROJECT_ROOT, "data", "peer_index"))
+
+# Bounded LRU of root-cause text -> embedding, so a locked root cause is only encoded once
+MATCH_EMBED_CACHE_SIZE = int(os.getenv("MATCH_EMBED_CACHE_SIZE", "256"))
+
+# Default threshold of 0.70 (cosine similarity)
+SIMILARITY_THRESHOLD = 0.70
 
 class PeerMatchmaker:
-    def __init__(self):
-        if not PINECONE_API_KEY:
-             raise ValueError("PINECONE_API_KEY not found in environment.")
-        
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
-        self.index = self.pc.Index(INDEX_NAME)
+    def __init__(self, backend: str = PEER_INDEX_BACKEND):
+        self.backend = backend
         self.model = SentenceTransformer(EMBEDDING_MODEL)
+        self._embedding_cache = OrderedDict()
+        self._embedding_lock = threading.Lock()
+
+        if backend == "local":
+            self.index = LocalPeerIndex.load(PEER_INDEX_DIR, expected_model=EMBEDDING_MODEL, source_path=PEERS_FILE)
+            if self.index is None:
+                # No prebuilt index yet: embed the peers file in-process
+                with open(PEERS_FILE, "r", encoding="utf-8") as f:
+                    peers = json.load(f)
+                self.index = LocalPeerIndex.from_peers(peers, self.model, EMBEDDING_MODEL, dtype=PEER_INDEX_DTYPE)
+            print(f"[MATCHMAKER]: Local peer index ready ({len(self.index)} peers).")
+        elif backend == "pinecone":
+            if not PINECONE_API_KEY:
+                raise ValueError("PINECONE_API_KEY not found in environment.")
+            self.pc = Pinecone(api_key=PINECONE_API_KEY)
+            self.index = self.pc.Index(INDEX_NAME)
+        else:
+            raise ValueError(f"Unknown PEER_INDEX_BACKEND '{backend}'. Use 'pinecone' or 'local'.")
+        self.index_version = self._resolve_index_version()
+
+    def _resolve_index_version(self) -> str:
+        """
+        Identifies the peer corpus being searched. Cached match results are only valid for this version.
+        """
+        if self.backend == "local" and self.index.version:
+            return self.index.version
+        if os.getenv("PEER_INDEX_VERSION"):
+            return os.getenv("PEER_INDEX_VERSION")
+        # build_peer_index.py --pinecone keeps the hosted index in step with the local manifest
+        files = read_index_files(PEER_INDEX_DIR)
+        if files is not None:
+            return files[0]["index_version"]
+        return f"pinecone:{INDEX_NAME}"
+
+    def embed(self, text: str):
+        key = text.strip()
+        with self._embedding_lock:
+            vector = self._embedding_cache.get(key)
+            if vector is not None:
+                self._embedding_cache.move_to_end(key)
+                METRICS.incr("matchmaker.embedding_cache.hits")
+                return vector
+
+        METRICS.incr("matchmaker.embedding_cache.misses")
+        vector = self.model.encode(key)
+        with self._embedding_lock:
+            self._embedding_cache[key] = vector
+            while len(self._embedding_cache) > MATCH_EMBED_CACHE_SIZE:
+                self._embedding_cache.popitem(last=False)
+        return vector
+
+    def find_match_cached(self, root_cause: str, cache: dict):
+        """
+        find_match, memoized in a caller-owned (per-session) dict. The entry is reused until the
+        root cause or the peer index version changes. Always returns a fresh copy of the match.
+        """
+        if cache.get("root_cause") == root_cause and cache.get("index_version") == self.index_version:
+            METRICS.incr("matchmaker.match_cache.hits")
+            return copy.deepcopy(cache.get("match"))
+
+        METRICS.incr("matchmaker.match_cache.misses")
+        match = self.find_match(root_cause)
+        cache.clear()
+        cache.update({"root_cause": root_cause, "index_version": self.index_version, "match": copy.deepcopy(match)})
+        return match
 
     def find_match(self, root_cause: str, top_k: int = 1):
         """
-        Takes a detected root cause, embeds it, and searches Pinecone for the closest peer.
+        Takes a detected root cause, embeds it, and searches the peer index for the closest peer.
         """
         if not root_cause or root_cause == "-":
             return None
 
         # Embed the query
-        query_vector = self.model.encode(root_cause).tolist()
+        query_vector = self.embed(root_cause)
+        if self.backend == "pinecone":
+            query_vector = query_vector.tolist()
 
-        # Query Pinecone
+        # Query the index (Pinecone and the local index return the same shape)
         results = self.index.query(
             vector=query_vector,
             top_k=top_k,
@@ -44,9 +128,6 @@ class PeerMatchmaker:
             # Cap the score at 1.0 to handle potential floating point precision drift
             score = min(score, 1.0)
             
-            # Use a default threshold of 0.70 (cosine similarity)
-            SIMILARITY_THRESHOLD = 0.70
-            
             if score < SIMILARITY_THRESHOLD:
                 print(f"[DEBUG]: Match found but score ({score:.4f}) is below threshold ({SIMILARITY_THRESHOLD}).")
                 return None
@@ -57,14 +138,3 @@ class PeerMatchmaker:
             return metadata
         
         return None
-
-if __name__ == "__main__":
-    # Quick test
-    try:
-        matchmaker = PeerMatchmaker()
-        test_cause = "Academic pressure and fear of failure"
-        match = matchmaker.find_match(test_cause)
-        print(f"Test Cause: {test_cause}")
-        print(f"Match: {match}")
-    except Exception as e:
-        print(f"Matchmaker Test Error: {e}")
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from .executors import PoolSaturated
+from .metrics import METRICS
+
+# Lower runs first
+PRIORITY_CRISIS = 0
+PRIORITY_HIGH_RISK = 1
+PRIORITY_ROUTINE = 2
+
+
+def _parse_limits(spec: str) -> dict:
+    # "ministral-3:3b=2,gemma3:4b=2" -> {"ministral-3:3b": 2, "gemma3:4b": 2}
+    limits = {}
+    for item in spec.split(","):
+        model, _, value = item.strip().rpartition("=")
+        if model and value.strip().isdigit():
+            limits[model.strip()] = int(value)
+    return limits
+
+
+# Concurrent Ollama requests allowed per model, and the default for models not listed
+OLLAMA_MODEL_CONCURRENCY = _parse_limits(os.getenv("OLLAMA_MODEL_CONCURRENCY", "ministral-3:3b=2,gemma3:4b=2"))
+OLLAMA_DEFAULT_CONCURRENCY = int(os.getenv("OLLAMA_DEFAULT_CONCURRENCY", "2"))
+# Requests allowed to wait per model before new ones are rejected
+OLLAMA_MAX_QUEUE = int(os.getenv("OLLAMA_MAX_QUEUE", "64"))
+
+
+class _Waiter:
+    __slots__ = ("future", "session_id", "priority", "seq", "enqueued", "token")
+
+    def __init__(self, future, session_id, priority, seq, token):
+        self.future = future
+        self.session_id = session_id
+        self.priority = priority
+        self.seq = seq
+        self.token = token
+        self.enqueued = time.monotonic()
+
+
+class ModelLane:
+    """
+    Admission for one model: at most max_concurrent requests in flight. Waiters are granted by
+    priority, then by how many requests their session already has in flight (so one session
+    cannot crowd out the others), then in arrival order.
+    """
+
+    def __init__(self, model: str, max_concurrent: int, max_queue: int):
+        self.model = model
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.running = 0
+        self._waiters = []
+        self._inflight = Counter()
+        self._seq = itertools.count()
+
+    def _update_gauges(self):
+        METRICS.set_gauge(f"scheduler.{self.model}.running", self.running)
+        METRICS.set_gauge(f"scheduler.{self.model}.queued", len(self._waiters))
+
+    def _grant(self, session_id: str, priority: int, waited: float):
+        self.running += 1
+        self._inflight[session_id] += 1
+        METRICS.observe(f"scheduler.{self.model}.queue_wait_seconds", waited)
+        METRICS.observe(f"scheduler.queue_wait_seconds.priority_{priority}", waited)
+
+    async def acquire(self, session_id: str, priority: int, token=None):
+        if self.running < self.max_concurrent and not self._waiters:
+            self._grant(session_id, priority, 0.0)
+            self._update_gauges()
+            return
+        if len(self._waiters) >= self.max_queue:
+            METRICS.incr(f"scheduler.{self.model}.rejected")
+            raise PoolSaturated(f"The {self.model} queue is full ({self.max_concurrent} running, {self.max_queue} queued).")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), session_id, priority, next(self._seq), token)
+        self._waiters.append(waiter)
+        self._update_gauges()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._update_gauges()
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller gave up; hand the slot on
+                self.release(session_id)
+            raise
+
+    def escalate(self, token, priority: int):
+        """
+        Moves the queued request acquired with token up to priority (never down).
+        """
+        for waiter in self._waiters:
+            if waiter.token is token and priority < waiter.priority:
+                waiter.priority = priority
+                METRICS.incr(f"scheduler.{self.model}.escalated")
+
+    def release(self, session_id: str):
+        self.running -= 1
+        self._inflight[session_id] -= 1
+        if self._inflight[session_id] <= 0:
+            del self._inflight[session_id]
+        while self.running < self.max_concurrent and self._waiters:
+            waiter = min(self._waiters, key=lambda w: (w.priority, self._inflight[w.session_id], w.seq))
+            self._waiters.remove(waiter)
+            if waiter.future.done():
+                continue
+            self._grant(waiter.session_id, waiter.priority, time.monotonic() - waiter.enqueued)
+            waiter.future.set_result(None)
+        self._update_gauges()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "running": self.running,
+            "queued": len(self._waiters),
+            "queued_by_priority": dict(Counter(w.priority for w in self._waiters)),
+        }
+
+
+class ModelScheduler:
+    """
+    Single entry point for Ollama calls from the API event loop, with one lane per model.
+    """
+
+    def __init__(self, limits: dict | None = None, default_limit: int = OLLAMA_DEFAULT_CONCURRENCY,
+                 max_queue: int = OLLAMA_MAX_QUEUE):
+        self.limits = dict(OLLAMA_MODEL_CONCURRENCY if limits is None else limits)
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self._lanes = {}
+
+    def lane(self, model: str) -> ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = ModelLane(model, self.limits.get(model, self.default_limit), self.max_queue)
+        return lane
+
+    @asynccontextmanager
+    async def slot(self, model: str, session_id: str, priority: int = PRIORITY_ROUTINE, token=None):
+        # token identifies the request to escalate() while it is still queued
+        lane = self.lane(model)
+        await lane.acquire(session_id, priority, token)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            METRICS.observe(f"scheduler.{model}.run_seconds", time.monotonic() - started)
+            lane.release(session_id)
+
+    async def run(self, model: str, coro, session_id: str, priority: int = PRIORITY_ROUTINE, token=None):
+        """
+        Awaits coro once model has a free slot for it.
+        """
+        try:
+            async with self.slot(model, session_id, priority, token):
+                return await coro
+        finally:
+            # Never started if the slot was refused or the wait was cancelled
+            coro.close()
+
+    async def stream(self, model: str, agen, session_id: str, priority: int = PRIORITY_ROUTINE):
+        """
+        Relays an async generator, holding a slot of model from the first item to the last.
+        """
+        try:
+            async with self.slot(model, session_id, priority):
+                async for item in agen:
+                    yield item
+        finally:
+            await agen.aclose()
+
+    def escalate(self, model: str, token, priority: int):
+        self.lane(model).escalate(token, priority)
+
+    def queued(self) -> int:
+        return sum(len(lane._waiters) for lane in self._lanes.values())
+
+    def stats(self) -> dict:
+        return {model: lane.stats() for model, lane in self._lanes.items()}
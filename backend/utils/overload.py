@@ -0,0 +1,108 @@
+import os
+import time
+from collections import deque
+
+from .metrics import METRICS
+
+
+def _thresholds(spec: str) -> tuple:
+    return tuple(float(value) for value in spec.split(",") if value.strip())
+
+
+# Pressure at which each degradation level (1, 2, 3) starts: model requests waiting for a slot,
+# and the 90th percentile time from queueing a listener stream to its first token over the recent window
+OVERLOAD_QUEUE_THRESHOLDS = _thresholds(os.getenv("OVERLOAD_QUEUE_THRESHOLDS", "4,8,16"))
+OVERLOAD_TTFT_THRESHOLDS = _thresholds(os.getenv("OVERLOAD_TTFT_THRESHOLDS", "3,6,10"))
+OVERLOAD_TTFT_WINDOW_SECONDS = float(os.getenv("OVERLOAD_TTFT_WINDOW_SECONDS", "30"))
+# Levels drop by one per this many seconds of lower pressure
+OVERLOAD_COOLDOWN_SECONDS = float(os.getenv("OVERLOAD_COOLDOWN_SECONDS", "15"))
+# Listener num_predict at levels 1, 2 and 3
+OVERLOAD_LISTENER_NUM_PREDICT = tuple(int(v) for v in _thresholds(os.getenv("OVERLOAD_LISTENER_NUM_PREDICT", "512,256,192")))
+
+LEVEL_NAMES = ("normal", "tight_listener", "shed_mapper", "defer_matching")
+# The level at which each kind of shedding starts
+LEVEL_SHED_MAPPER = 2
+LEVEL_DEFER_MATCHING = 3
+
+
+class OverloadController:
+    """
+    Picks a degradation level from scheduler queue depth and recent time to first token.
+    Pressure raises the level one step per update; it falls back one step per cooldown period
+    once pressure has eased, so short lulls in a spike do not flap between levels.
+    """
+
+    def __init__(self, queue_depth, queue_thresholds: tuple = OVERLOAD_QUEUE_THRESHOLDS,
+                 ttft_thresholds: tuple = OVERLOAD_TTFT_THRESHOLDS,
+                 window_seconds: float = OVERLOAD_TTFT_WINDOW_SECONDS,
+                 cooldown_seconds: float = OVERLOAD_COOLDOWN_SECONDS):
+        # queue_depth() returns the number of model requests currently waiting
+        self.queue_depth = queue_depth
+        self.queue_thresholds = queue_thresholds
+        self.ttft_thresholds = ttft_thresholds
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self.level = 0
+        self.changed_at = time.monotonic()
+        # Since when pressure has been below the current level
+        self._calm_since = self.changed_at
+        self._ttft = deque()
+        METRICS.set_gauge("overload.level", 0)
+
+    def record_ttft(self, seconds: float):
+        self._ttft.append((time.monotonic(), seconds))
+        self.update()
+
+    def ttft_p90(self) -> float:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._ttft and self._ttft[0][0] < cutoff:
+            self._ttft.popleft()
+        if not self._ttft:
+            return 0.0
+        samples = sorted(seconds for _, seconds in self._ttft)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.9))]
+
+    def update(self) -> int:
+        queued = self.queue_depth()
+        ttft = self.ttft_p90()
+        target = max(
+            sum(1 for threshold in self.queue_thresholds if queued >= threshold),
+            sum(1 for threshold in self.ttft_thresholds if ttft >= threshold),
+        )
+        now = time.monotonic()
+        level = self.level
+        if target >= level:
+            self._calm_since = now
+        if target > level:
+            level += 1
+        elif target < level:
+            level = max(target, level - int((now - self._calm_since) // self.cooldown_seconds))
+
+        METRICS.set_gauge("overload.queue_depth", queued)
+        METRICS.set_gauge("overload.ttft_p90_seconds", ttft)
+        if level != self.level:
+            print(f"[API WARN] Overload level {self.level} ({LEVEL_NAMES[self.level]}) -> {level} ({LEVEL_NAMES[level]}): "
+                  f"{queued} model requests queued, p90 time to first token {ttft:.2f}s")
+            METRICS.incr("overload.level_changes")
+            METRICS.incr(f"overload.entered.{LEVEL_NAMES[level]}")
+            METRICS.set_gauge("overload.level", level)
+            self.level = level
+            self.changed_at = self._calm_since = now
+        return self.level
+
+    def listener_num_predict(self, level: int):
+        """
+        num_predict override for the listener at level, or None for the model's default.
+        """
+        if level <= 0 or not OVERLOAD_LISTENER_NUM_PREDICT:
+            return None
+        return OVERLOAD_LISTENER_NUM_PREDICT[min(level, len(OVERLOAD_LISTENER_NUM_PREDICT)) - 1]
+
+    def stats(self) -> dict:
+        return {
+            "level": self.level,
+            "level_name": LEVEL_NAMES[self.level],
+            "queue_depth": self.queue_depth(),
+            "ttft_p90_seconds": round(self.ttft_p90(), 3),
+            "seconds_at_level": round(time.monotonic() - self.changed_at, 1),
+        }
@@ -0,0 +1,115 @@
+import bisect
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+# How often (seconds) a lookup may stat peers.json to see whether it changed
+PEER_DIRECTORY_CHECK_INTERVAL = float(os.getenv("PEER_DIRECTORY_CHECK_INTERVAL", "2.0"))
+
+
+def _parse_slot(start_time: str):
+    slot = datetime.datetime.fromisoformat(start_time)
+    # Treat offset-less slots as server-local time so every slot sorts on one timeline
+    return slot if slot.tzinfo else slot.astimezone()
+
+
+class PeerDirectory:
+    """
+    peers.json loaded once into a dict keyed by peer_id, with availability pre-parsed and sorted.
+    The file is re-read only when its mtime/size and then its content hash change, and the new
+    snapshot replaces the old one in a single swap so readers never see a half-loaded directory.
+    """
+
+    def __init__(self, path: str, check_interval: float = PEER_DIRECTORY_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries: dict = {}
+        self._signature = None
+        self._content_hash = None
+        self._last_check = 0.0
+        self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if not force and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            try:
+                stat = os.stat(self.path)
+                signature = (stat.st_mtime_ns, stat.st_size)
+                if signature == self._signature:
+                    return
+                with open(self.path, "rb") as f:
+                    raw = f.read()
+                content_hash = hashlib.sha256(raw).hexdigest()
+                if content_hash != self._content_hash:
+                    self._entries = self._build_entries(json.loads(raw))
+                    self._content_hash = content_hash
+                    print(f"[PEER DIRECTORY]: Loaded {len(self._entries)} peers from {self.path}")
+                self._signature = signature
+            except Exception as e:
+                # Keep serving the last good snapshot
+                print(f"[PEER DIRECTORY ERROR]: Failed to reload {self.path}: {e}")
+
+    @staticmethod
+    def _build_entries(peers: list) -> dict:
+        entries = {}
+        for peer in peers:
+            peer_id = peer.get("peer_id")
+            if not peer_id:
+                continue
+            slots = []
+            for slot in peer.get("availability", []):
+                try:
+                    slots.append((_parse_slot(slot["start_time"]), slot))
+                except (KeyError, TypeError, ValueError):
+                    print(f"[PEER DIRECTORY WARN]: Skipping malformed slot {slot!r} for {peer_id}")
+            slots.sort(key=lambda s: s[0])
+            entries[peer_id] = {
+                "peer": peer,
+                "slot_times": [s[0] for s in slots],
+                "availability": [s[1] for s in slots],
+            }
+        return entries
+
+    def __len__(self):
+        self._maybe_reload()
+        return len(self._entries)
+
+    def get(self, peer_id: str):
+        self._maybe_reload()
+        entry = self._entries.get(peer_id)
+        return entry["peer"] if entry else None
+
+    def availability(self, peer_id: str) -> list:
+        """
+        The peer's slots in the peers.json shape ([{"start_time": ...}]), sorted by time.
+        """
+        self._maybe_reload()
+        entry = self._entries.get(peer_id)
+        return [dict(slot) for slot in entry["availability"]] if entry else []
+
+    def listed_slot(self, peer_id: str, selected_slot: str):
+        """
+        The peer's own start_time for selected_slot, matched by time rather than by string,
+        or None if the peer does not list that slot.
+        """
+        try:
+            wanted = _parse_slot(selected_slot)
+        except (TypeError, ValueError):
+            return None
+        self._maybe_reload()
+        entry = self._entries.get(peer_id)
+        if not entry:
+            return None
+        index = bisect.bisect_left(entry["slot_times"], wanted)
+        if index < len(entry["slot_times"]) and entry["slot_times"][index] == wanted:
+            return entry["availability"][index]["start_time"]
+        return None
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+# Storage precision for the peer embedding matrix. float16 halves the memory
+# footprint; float32 keeps the matrix-vector product on the BLAS fast path.
+SUPPORTED_DTYPES = {"float32": np.float32, "float16": np.float16}
+
+# On-disk layout written by backend/scripts/build_peer_index.py. Each build gets its own
+# directory under BUILDS_DIR; CURRENT names the live one and is swapped in a single os.replace
+EMBEDDINGS_FILE = "embeddings.npy"
+SIDECAR_FILE = "peers.jsonl"
+MANIFEST_FILE = "manifest.json"
+BUILDS_DIR = "builds"
+CURRENT_FILE = "CURRENT"
+
+# Fields that only matter for scheduling and must never be returned as match metadata
+NON_METADATA_FIELDS = ("peer_id", "availability")
+
+
+def peer_embedding_text(peer: dict) -> str:
+    """
+    The text a peer is embedded under: their root cause, followed by the clinical notes.
+    """
+    root_cause = (peer.get("root_cause_of_the_distress") or "").strip()
+    notes = (peer.get("clinical_notes") or "").strip()
+    return f"{root_cause}. {notes}" if notes else root_cause
+
+
+def peer_content_hash(peer: dict, model_name: str) -> str:
+    """
+    Changes whenever the embedded text (or the model embedding it) changes, so a rebuild
+    only re-embeds peers whose root cause or clinical notes were edited.
+    """
+    payload = f"{model_name}\n{peer_embedding_text(peer)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def index_version(ids: list, content_hashes: list) -> str:
+    digest = hashlib.sha256()
+    for peer_id, content_hash in zip(ids, content_hashes):
+        digest.update(f"{peer_id}:{content_hash}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def iter_peer_records(path: str):
+    """
+    Yields peer records from a JSON array (data/peers.json) or, line by line, from a JSONL export.
+    """
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def source_file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_build_dir(index_dir: str):
+    """
+    The directory of the live build, or None if nothing has been published yet.
+    """
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        # Indexes built before versioned directories keep their files at the top level
+        return index_dir if os.path.exists(os.path.join(index_dir, MANIFEST_FILE)) else None
+    return os.path.join(index_dir, BUILDS_DIR, name)
+
+
+def new_build_dir(index_dir: str, build_name: str) -> str:
+    build_dir = os.path.join(index_dir, BUILDS_DIR, build_name)
+    os.makedirs(build_dir)
+    return build_dir
+
+
+def publish_build(index_dir: str, build_dir: str, keep: int = 2):
+    """
+    Points CURRENT at a fully written build, then deletes all but the newest `keep` builds.
+    The previous build stays on disk so readers that resolved it just before the swap can finish.
+    """
+    tmp_current = os.path.join(index_dir, CURRENT_FILE + ".tmp")
+    with open(tmp_current, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(build_dir))
+    os.replace(tmp_current, os.path.join(index_dir, CURRENT_FILE))
+
+    builds_root = os.path.join(index_dir, BUILDS_DIR)
+    builds = sorted(os.listdir(builds_root), key=lambda name: (os.path.getmtime(os.path.join(builds_root, name)), name))
+    for name in builds[:-keep]:
+        if name == os.path.basename(build_dir):
+            continue
+        try:
+            shutil.rmtree(os.path.join(builds_root, name))
+        except OSError as e:
+            # e.g. still memory-mapped by a running process on Windows; the next build retries
+            print(f"[BUILD WARN]: Could not remove old build {name}: {e}")
+
+
+def read_index_files(index_dir: str):
+    """
+    Returns (manifest, sidecar rows, memory-mapped embedding matrix) of the live build,
+    or None if no index was built.
+    """
+    build_dir = current_build_dir(index_dir)
+    if build_dir is None:
+        return None
+    with open(os.path.join(build_dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    with open(os.path.join(build_dir, SIDECAR_FILE), "r", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    matrix = np.load(os.path.join(build_dir, EMBEDDINGS_FILE), mmap_mode="r")
+    return manifest, rows, matrix
+
+
+def peer_metadata(peer: dict) -> dict:
+    return {k: v for k, v in peer.items() if k not in NON_METADATA_FIELDS}
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalPeerIndex:
+    """
+    In-process cosine index over a contiguous, pre-normalized embedding matrix.
+    query() mirrors the shape of a Pinecone query response so callers can swap backends.
+    """
+
+    def __init__(self, ids: list, metadata: list, matrix: np.ndarray, dtype: str = "float32",
+                 normalized: bool = False, version: str | None = None):
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported peer index dtype '{dtype}'. Use one of {list(SUPPORTED_DTYPES)}.")
+        if len(ids) != len(metadata) or len(ids) != matrix.shape[0]:
+            raise ValueError("Peer ids, metadata and embedding rows must have the same length.")
+
+        self.ids = list(ids)
+        self.metadata = list(metadata)
+        self.dtype = SUPPORTED_DTYPES[dtype]
+        self.version = version
+        if normalized and matrix.dtype == self.dtype:
+            # Already normalized on disk: keep the memory map as-is instead of copying it
+            self.matrix = matrix
+        else:
+            # Normalize once up front so a query is a single matrix-vector product
+            self.matrix = np.ascontiguousarray(normalize_rows(np.asarray(matrix, dtype=np.float32)), dtype=self.dtype)
+
+    @classmethod
+    def from_peers(cls, peers: list, model, model_name: str, dtype: str = "float32", batch_size: int = 64):
+        """
+        Embeds a list of peer records (the data/peers.json shape) with the given SentenceTransformer.
+        """
+        texts = [peer_embedding_text(p) for p in peers]
+        matrix = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        ids = [p["peer_id"] for p in peers]
+        metadata = [peer_metadata(p) for p in peers]
+        version = index_version(ids, [peer_content_hash(p, model_name) for p in peers])
+        return cls(ids, metadata, matrix, dtype=dtype, version=version)
+
+    @classmethod
+    def load(cls, index_dir: str, expected_model: str | None = None, source_path: str | None = None):
+        """
+        Memory-maps a prebuilt index directory. Returns None if nothing has been built there yet.
+        Warns if source_path has changed since the index was built from it.
+        """
+        files = read_index_files(index_dir)
+        if files is None:
+            return None
+        manifest, rows, matrix = files
+        if expected_model and manifest.get("model") != expected_model:
+            raise ValueError(
+                f"Peer index at {index_dir} was built with '{manifest.get('model')}', expected '{expected_model}'. Rebuild it."
+            )
+        if source_path and manifest.get("source_hash") and os.path.exists(source_path):
+            if source_file_hash(source_path) != manifest["source_hash"]:
+                print(f"[MATCHMAKER WARN]: {source_path} changed since peer index {manifest['index_version'][:12]} "
+                      f"was built. Rerun backend/scripts/build_peer_index.py.")
+        ids = [row["peer_id"] for row in rows]
+        metadata = [row["metadata"] for row in rows]
+        return cls(ids, metadata, matrix, dtype=manifest["dtype"], normalized=True, version=manifest["index_version"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, vector, top_k: int = 1, include_metadata: bool = True) -> dict:
+        if not self.ids:
+            return {"matches": []}
+
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return {"matches": []}
+        query = (query / norm).astype(self.dtype, copy=False)
+
+        scores = self.matrix @ query
+        top_k = max(1, min(top_k, len(self.ids)))
+        if top_k < len(self.ids):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(self.ids))
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        matches = []
+        for row in ranked:
+            match = {"id": self.ids[row], "score": float(scores[row])}
+            if include_metadata:
+                # Hand out a copy, callers decorate the metadata dict in place
+                match["metadata"] = dict(self.metadata[row])
+            matches.append(match)
+        return {"matches": matches}
@@ -0,0 +1,206 @@
+import asyncio
+import atexit
+import datetime
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+from .metrics import METRICS
+
+# "async": turns are appended by a background thread in batches (default)
+# "fsync": same, but every batch is fsync'd before the next one is taken
+# "sync":  the caller writes and fsyncs its own line, no background thread
+SESSION_LOG_DURABILITY = os.getenv("SESSION_LOG_DURABILITY", "async").strip().lower()
+SESSION_LOG_FLUSH_INTERVAL = float(os.getenv("SESSION_LOG_FLUSH_INTERVAL", "0.5"))
+SESSION_LOG_QUEUE_SIZE = int(os.getenv("SESSION_LOG_QUEUE_SIZE", "1024"))
+
+_STOP = object()
+
+
+def _encode(entry: dict) -> str:
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+
+
+def _append_lines(path: str, lines: list, fsync: bool):
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(lines)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class SessionLogWriter:
+    """
+    Appends one compact JSON line per turn. In "async" and "fsync" mode, writes happen on a
+    background thread that drains a bounded queue every flush interval. In "sync" mode, after
+    close(), or when the queue is full, the line is written inline instead of being dropped:
+    append() then does file I/O on the calling thread, so coroutines should use aappend(),
+    which moves that write to a worker thread.
+    """
+
+    def __init__(self, durability: str = SESSION_LOG_DURABILITY,
+                 flush_interval: float = SESSION_LOG_FLUSH_INTERVAL, max_queue: int = SESSION_LOG_QUEUE_SIZE):
+        if durability not in ("async", "fsync", "sync"):
+            raise ValueError(f"Unknown SESSION_LOG_DURABILITY '{durability}'. Use 'async', 'fsync' or 'sync'.")
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="session-log-writer", daemon=True)
+                self._thread.start()
+
+    def _enqueue(self, path: str, line: str) -> bool:
+        """
+        Hands the line to the writer thread. False means the caller has to write it itself.
+        """
+        if self.durability == "sync" or self._closed:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((path, line))
+        except queue.Full:
+            METRICS.incr("session_log.queue_full_inline_writes")
+            return False
+        return True
+
+    def _write_inline(self, path: str, line: str):
+        _append_lines(path, [line], fsync=self.durability != "async" or self._closed)
+
+    def append(self, path: str, entry: dict):
+        line = _encode(entry)
+        if not self._enqueue(path, line):
+            self._write_inline(path, line)
+
+    async def aappend(self, path: str, entry: dict):
+        """
+        append() for coroutines: an inline write runs in a worker thread, not on the event loop.
+        """
+        line = _encode(entry)
+        if not self._enqueue(path, line):
+            await asyncio.to_thread(self._write_inline, path, line)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Keep collecting for one flush interval so a burst of turns costs one write per file
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or batch[-1] is _STOP:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is _STOP:
+                stopping = True
+                # Drain whatever raced in behind the stop marker
+                while True:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            self._write_batch([item for item in batch if item is not _STOP])
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch: list):
+        by_path: dict = {}
+        for path, line in batch:
+            by_path.setdefault(path, []).append(line)
+        for path, lines in by_path.items():
+            try:
+                _append_lines(path, lines, fsync=self.durability == "fsync")
+            except Exception as e:
+                print(f"[LOG ERROR]: Failed to write {len(lines)} turns to {path}: {e}")
+        METRICS.incr("session_log.lines_written", len(batch))
+        METRICS.incr("session_log.batches_written")
+
+    def flush(self):
+        """
+        Blocks until every queued line has been written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self, timeout: float = 10.0):
+        """
+        Flushes outstanding lines and stops the writer thread. Later appends are written inline.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+
+LOG_WRITER = SessionLogWriter()
+atexit.register(LOG_WRITER.close)
+
+
+def allocate_session_log(log_dir: str) -> str:
+    """
+    Creates a new, uniquely named log file under log_dir/YYYY/MM/DD without listing the directory.
+    Names carry the creation time plus a random suffix, and the file is created exclusively, so
+    two sessions starting at the same moment can never be handed the same file.
+    """
+    now = datetime.datetime.now()
+    shard = os.path.join(log_dir, now.strftime("%Y"), now.strftime("%m"), now.strftime("%d"))
+    os.makedirs(shard, exist_ok=True)
+    while True:
+        suffix = uuid.uuid4().hex[:12]
+        path = os.path.join(shard, f"session_log_{now.strftime('%H%M%S')}_{suffix}.jsonl")
+        try:
+            with open(path, "x", encoding="utf-8"):
+                pass
+        except FileExistsError:
+            continue
+        return path
+
+
+def read_session_log(path: str) -> list:
+    """
+    Reads a session log as a list of turns. Understands both the JSONL format and the old
+    pretty-printed JSON array files.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if content.lstrip().startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def export_pretty(path: str, out_path: str | None = None) -> str:
+    """
+    Renders a session log in the old indent=4 JSON array format, for tooling that expects it.
+    """
+    rendered = json.dumps(read_session_log(path), indent=4)
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            f.write(rendered)
+    return rendered
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.session_log <session_log.jsonl> [output.json]
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.session_log <session_log.jsonl> [output.json]")
+        sys.exit(1)
+    output = export_pretty(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    if len(sys.argv) == 2:
+        print(output)
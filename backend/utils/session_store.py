@@ -0,0 +1,335 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+from .metrics import METRICS
+
+# Sessions idle for longer than this are moved out of memory
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "1800"))
+# Hard cap on sessions held in memory; least recently used ones spill first
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "1000"))
+# "memory": per-process store (single uvicorn worker); "sqlite": shared across worker processes
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory").strip().lower()
+# How long a turn may wait for another turn of the same session to finish
+SESSION_LOCK_TIMEOUT_SECONDS = float(os.getenv("SESSION_LOCK_TIMEOUT_SECONDS", "60"))
+# A lock held longer than this (e.g. by a crashed worker) is considered abandoned
+SESSION_LOCK_LEASE_SECONDS = float(os.getenv("SESSION_LOCK_LEASE_SECONDS", "300"))
+_LOCK_POLL_SECONDS = 0.02
+
+
+class SessionBusy(Exception):
+    pass
+
+
+def _encode(state: dict) -> str:
+    return json.dumps(state, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SessionBackend(ABC):
+    """
+    Interface the API uses for session state. Turns of one session are serialized with
+    lock(session_id); get_or_create/save read and write the state inside that lock.
+    """
+
+    @abstractmethod
+    def get_or_create(self, session_id: str, factory) -> dict:
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, state: dict):
+        ...
+
+    @abstractmethod
+    def try_acquire(self, session_id: str) -> str | None:
+        """
+        Takes the session's lock without waiting. Returns an owner token, or None if it is held.
+        """
+
+    @abstractmethod
+    def release(self, session_id: str, token: str):
+        ...
+
+    @contextmanager
+    def lock(self, session_id: str, timeout: float = SESSION_LOCK_TIMEOUT_SECONDS):
+        token = self._acquire(session_id, timeout)
+        try:
+            yield
+        finally:
+            self.release(session_id, token)
+
+    def _acquire(self, session_id: str, timeout: float) -> str:
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            token = self.try_acquire(session_id)
+            if token is not None:
+                METRICS.observe("sessions.lock_wait_seconds", time.monotonic() - started)
+                return token
+            if time.monotonic() >= deadline:
+                METRICS.incr("sessions.lock_timeouts")
+                raise SessionBusy(f"Session {session_id} is busy with another turn.")
+            time.sleep(_LOCK_POLL_SECONDS)
+
+    async def _atry_acquire(self, session_id: str) -> str | None:
+        return self.try_acquire(session_id)
+
+    async def _arelease(self, session_id: str, token: str):
+        self.release(session_id, token)
+
+    @asynccontextmanager
+    async def alock(self, session_id: str, timeout: float = SESSION_LOCK_TIMEOUT_SECONDS):
+        """
+        lock() for coroutines: waits on the event loop instead of blocking a thread.
+        """
+        started = time.monotonic()
+        deadline = started + timeout
+        while True:
+            token = await self._atry_acquire(session_id)
+            if token is not None:
+                METRICS.observe("sessions.lock_wait_seconds", time.monotonic() - started)
+                break
+            if time.monotonic() >= deadline:
+                METRICS.incr("sessions.lock_timeouts")
+                raise SessionBusy(f"Session {session_id} is busy with another turn.")
+            await asyncio.sleep(_LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            await self._arelease(session_id, token)
+
+    def sweep(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemorySessionStore(SessionBackend):
+    """
+    In-memory session state with idle-TTL and max-entries (LRU) eviction. Evicted sessions are
+    spilled as compact JSON to a SQLite file and rehydrated transparently on their next request.
+    Only valid for a single worker process.
+    """
+
+    def __init__(self, spill_path: str, max_entries: int = SESSION_MAX_ENTRIES,
+                 idle_ttl: float = SESSION_IDLE_TTL_SECONDS):
+        self._locks: dict = {}
+        self._locks_guard = threading.Lock()
+        self.spill_path = spill_path
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._lock = threading.RLock()
+        # session_id -> (state, last_access, approx_bytes), oldest access first
+        self._sessions = OrderedDict()
+        self._memory_bytes = 0
+
+        os.makedirs(os.path.dirname(os.path.abspath(spill_path)), exist_ok=True)
+        self._spill = sqlite3.connect(spill_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._spill.execute("PRAGMA journal_mode=WAL")
+        self._spill.execute("""
+            CREATE TABLE IF NOT EXISTS spilled_sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                spilled_at REAL NOT NULL
+            )
+        """)
+
+    def get_or_create(self, session_id: str, factory) -> dict:
+        with self._lock:
+            self._evict()
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions[session_id] = (entry[0], time.monotonic(), entry[2])
+                self._sessions.move_to_end(session_id)
+                return entry[0]
+
+            row = self._spill.execute(
+                "SELECT state FROM spilled_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None:
+                state = json.loads(row[0])
+                self._spill.execute("DELETE FROM spilled_sessions WHERE session_id = ?", (session_id,))
+                METRICS.incr("sessions.rehydrated")
+            else:
+                state = factory()
+                METRICS.incr("sessions.created")
+            self._put(session_id, state)
+            self._evict()
+            return state
+
+    def save(self, session_id: str, state: dict):
+        """
+        Records the end of a turn: refreshes the session's recency and re-admits it if it was
+        evicted while the turn was still running.
+        """
+        with self._lock:
+            self._put(session_id, state)
+            self._evict()
+
+    def _put(self, session_id: str, state: dict):
+        previous = self._sessions.pop(session_id, None)
+        if previous is not None:
+            self._memory_bytes -= previous[2]
+        size = len(_encode(state))
+        self._sessions[session_id] = (state, time.monotonic(), size)
+        self._memory_bytes += size
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, (state, last_access, size) = next(iter(self._sessions.items()))
+            if now - last_access > self.idle_ttl:
+                reason = "ttl"
+            elif len(self._sessions) > self.max_entries:
+                reason = "lru"
+            else:
+                break
+            self._sessions.popitem(last=False)
+            self._memory_bytes -= size
+            self._spill.execute(
+                "INSERT OR REPLACE INTO spilled_sessions (session_id, state, spilled_at) VALUES (?, ?, ?)",
+                (session_id, _encode(state), time.time()),
+            )
+            METRICS.incr(f"sessions.evicted.{reason}")
+        METRICS.set_gauge("sessions.in_memory", len(self._sessions))
+        METRICS.set_gauge("sessions.memory_bytes_estimate", self._memory_bytes)
+
+    def try_acquire(self, session_id: str) -> str | None:
+        with self._locks_guard:
+            if session_id in self._locks:
+                return None
+            token = uuid.uuid4().hex
+            self._locks[session_id] = token
+            return token
+
+    def release(self, session_id: str, token: str):
+        with self._locks_guard:
+            if self._locks.get(session_id) == token:
+                del self._locks[session_id]
+
+    def sweep(self):
+        with self._lock:
+            self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            spilled = self._spill.execute("SELECT COUNT(*) FROM spilled_sessions").fetchone()[0]
+            return {
+                "backend": "memory",
+                "in_memory": len(self._sessions),
+                "memory_bytes_estimate": self._memory_bytes,
+                "spilled": spilled,
+                "max_entries": self.max_entries,
+                "idle_ttl_seconds": self.idle_ttl,
+            }
+
+
+class SqliteSessionStore(SessionBackend):
+    """
+    Session state in a SQLite (WAL mode) file shared by every worker process. Per-session locks
+    are lease rows, so a turn in one worker blocks a concurrent turn of the same session in
+    another, and a lease left behind by a crashed worker expires on its own.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = SESSION_LOCK_LEASE_SECONDS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS session_locks (
+                session_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_or_create(self, session_id: str, factory) -> dict:
+        conn = self._conn()
+        row = conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+        state = factory()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+            (session_id, _encode(state), time.time()),
+        )
+        if cursor.rowcount == 0:
+            # Another worker created it first
+            row = conn.execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            return json.loads(row[0])
+        METRICS.incr("sessions.created")
+        return state
+
+    def save(self, session_id: str, state: dict):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?)",
+            (session_id, _encode(state), time.time()),
+        )
+
+    def try_acquire(self, session_id: str) -> str | None:
+        token = uuid.uuid4().hex
+        now = time.time()
+        cursor = self._conn().execute(
+            """
+            INSERT INTO session_locks (session_id, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT (session_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE session_locks.expires_at < ?
+            """,
+            (session_id, token, now + self.lease_seconds, now),
+        )
+        return token if cursor.rowcount == 1 else None
+
+    async def _atry_acquire(self, session_id: str) -> str | None:
+        # SQLite may wait on other workers' write locks; keep that off the event loop
+        return await asyncio.to_thread(self.try_acquire, session_id)
+
+    def release(self, session_id: str, token: str):
+        self._conn().execute("DELETE FROM session_locks WHERE session_id = ? AND owner = ?", (session_id, token))
+
+    async def _arelease(self, session_id: str, token: str):
+        # Same reason as _atry_acquire; the delete still finishes if the awaiting task is cancelled
+        await asyncio.to_thread(self.release, session_id, token)
+
+    def sweep(self):
+        self._conn().execute("DELETE FROM session_locks WHERE expires_at < ?", (time.time(),))
+
+    def stats(self) -> dict:
+        conn = self._conn()
+        return {
+            "backend": "sqlite",
+            "stored": conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            "locked": conn.execute("SELECT COUNT(*) FROM session_locks").fetchone()[0],
+        }
+
+
+def create_session_store(db_path: str, backend: str = SESSION_STORE_BACKEND) -> SessionBackend:
+    if backend == "memory":
+        return MemorySessionStore(db_path)
+    if backend == "sqlite":
+        return SqliteSessionStore(db_path)
+    raise ValueError(f"Unknown SESSION_STORE_BACKEND '{backend}'. Use 'memory' or 'sqlite'.")
@@ -0,0 +1,74 @@
+import asyncio
+import os
+from contextlib import suppress
+
+from .metrics import METRICS
+
+# Defaults for batching streamed text into SSE frames; a request may override both
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "30"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "256"))
+
+
+async def coalesce_stream(stream, window_ms: float = SSE_COALESCE_MS, max_bytes: int = SSE_COALESCE_BYTES,
+                          flush_chars: set = frozenset()):
+    """
+    Re-chunks an async text stream into fewer, larger pieces. The first chunk goes out at once;
+    after that, chunks are held until window_ms has passed since the first held one, the held
+    text reaches max_bytes, or a chunk ends with one of flush_chars (a sentence boundary).
+    A window of 0 passes chunks straight through. Closing this generator does not close stream.
+    """
+    if window_ms <= 0:
+        async for chunk in stream:
+            METRICS.incr("sse.coalesce.chunks")
+            METRICS.incr("sse.coalesce.frames")
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    held, held_bytes, flush_at = [], 0, 0.0
+    first = True
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(stream))
+            timeout = max(0.0, flush_at - loop.time()) if held else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Window elapsed while the model was still producing the next chunk
+                METRICS.incr("sse.coalesce.frames")
+                yield "".join(held)
+                held, held_bytes = [], 0
+                continue
+
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+            METRICS.incr("sse.coalesce.chunks")
+            if first:
+                first = False
+                METRICS.incr("sse.coalesce.frames")
+                yield chunk
+                continue
+
+            if not held:
+                flush_at = loop.time() + window
+            held.append(chunk)
+            held_bytes += len(chunk.encode("utf-8"))
+            if held_bytes >= max_bytes or chunk.rstrip()[-1:] in flush_chars:
+                METRICS.incr("sse.coalesce.frames")
+                yield "".join(held)
+                held, held_bytes = [], 0
+
+        if held:
+            METRICS.incr("sse.coalesce.frames")
+            yield "".join(held)
+    finally:
+        if pending is not None:
+            # The source stream can only be closed once no __anext__ is in flight
+            pending.cancel()
+            with suppress(asyncio.CancelledError, StopAsyncIteration, Exception):
+                await pending
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from .metrics import METRICS
+
+# How long a turn keeps generating with no connected client before it is cancelled
+SSE_RESUME_GRACE_SECONDS = float(os.getenv("SSE_RESUME_GRACE_SECONDS", "10"))
+# How long a finished turn's events stay available for replay
+SSE_REPLAY_TTL_SECONDS = float(os.getenv("SSE_REPLAY_TTL_SECONDS", "120"))
+SSE_REPLAY_MAX_TURNS = int(os.getenv("SSE_REPLAY_MAX_TURNS", "1000"))
+
+
+class TurnStream:
+    """
+    One chat turn's SSE events, produced by a task that is independent of any connection.
+    Clients subscribe from an event index: a reconnect replays what it missed and then
+    follows the live stream. Once the last subscriber leaves an unfinished turn, the producer
+    is cancelled after grace_seconds unless someone reconnects first.
+    """
+
+    def __init__(self, session_id: str, key: str, grace_seconds: float = SSE_RESUME_GRACE_SECONDS):
+        self.turn_id = uuid.uuid4().hex[:16]
+        self.session_id = session_id
+        self.key = key
+        self.grace_seconds = grace_seconds
+        self.events = []
+        self.done = False
+        self.cancelled = False
+        self.failed = False
+        self.finished_at = None
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+        self._task = None
+        self._reaper = None
+
+    def start(self, source):
+        self._task = asyncio.create_task(self._produce(source))
+
+    async def _produce(self, source):
+        try:
+            async for event in source:
+                self.events.append(event)
+                self._notify()
+        except Exception as e:
+            print(f"[API ERROR] Turn {self.turn_id} of session {self.session_id} failed: {e}")
+            METRICS.incr("sse.turns_failed")
+            self.failed = True
+            self.events.append(f"data: {json.dumps({'type': 'error', 'message': 'The reply could not be generated. Please try again.'})}\n\n")
+        finally:
+            await source.aclose()
+            self.done = True
+            self.finished_at = time.monotonic()
+            self._notify()
+
+    def _notify(self):
+        # Wake every waiting subscriber; later waiters get a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def event_id(self, index: int) -> str:
+        return f"{self.turn_id}:{index}"
+
+    async def subscribe(self, after: int, is_disconnected, poll_seconds: float):
+        """
+        Yields SSE frames (with id lines) for events after index `after`, until the turn ends
+        or is_disconnected() reports the client gone.
+        """
+        self.subscribers += 1
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        try:
+            index = max(0, after)
+            while True:
+                while index < len(self.events):
+                    index += 1
+                    yield f"id: {self.event_id(index)}\n{self.events[index - 1]}"
+                if self.done:
+                    return
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=poll_seconds)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self._reaper = asyncio.create_task(self._reap_after_grace())
+
+    async def _reap_after_grace(self):
+        await asyncio.sleep(self.grace_seconds)
+        if self.subscribers == 0 and not self.done and self._task is not None:
+            METRICS.incr("sse.resume.reaped")
+            self.cancel("client_disconnected")
+
+    def cancel(self, reason: str = "stream_cancelled"):
+        if self._task is not None and not self.done:
+            self.cancelled = True
+            self._task.cancel(reason)
+
+
+class TurnRegistry:
+    """
+    In-process index of recent turns by turn id and by (session_id, idempotency key).
+    Replay therefore works within one worker process.
+    """
+
+    def __init__(self, ttl_seconds: float = SSE_REPLAY_TTL_SECONDS, max_turns: int = SSE_REPLAY_MAX_TURNS):
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        self._by_id = {}
+        self._by_key = {}
+
+    def get(self, turn_id: str):
+        return self._by_id.get(turn_id)
+
+    def find(self, session_id: str, key: str):
+        # A cancelled or failed turn never finished, so a resubmission has to run it again
+        turn = self._by_key.get((session_id, key))
+        return turn if turn is not None and not (turn.cancelled or turn.failed) else None
+
+    def forget(self, session_id: str, key: str):
+        """
+        Stops resubmissions with this key from attaching (the turn stays resumable by id).
+        """
+        self._by_key.pop((session_id, key), None)
+
+    def add(self, turn: TurnStream):
+        self.sweep()
+        self._by_id[turn.turn_id] = turn
+        self._by_key[(turn.session_id, turn.key)] = turn
+
+    def _remove(self, turn: TurnStream):
+        self._by_id.pop(turn.turn_id, None)
+        if self._by_key.get((turn.session_id, turn.key)) is turn:
+            del self._by_key[(turn.session_id, turn.key)]
+
+    def sweep(self):
+        now = time.monotonic()
+        for turn in list(self._by_id.values()):
+            if turn.done and now - turn.finished_at > self.ttl_seconds:
+                self._remove(turn)
+        # Oldest finished turns go first when over the cap
+        finished = sorted((t for t in self._by_id.values() if t.done), key=lambda t: t.finished_at)
+        while len(self._by_id) > self.max_turns and finished:
+            self._remove(finished.pop(0))
+        METRICS.set_gauge("sse.resume.buffered_turns", len(self._by_id))
+
+    def cancel_all(self):
+        for turn in list(self._by_id.values()):
+            turn.cancel("server_shutdown")
+
+
+def parse_event_id(event_id: str | None) -> tuple:
+    """
+    Splits a "<turn_id>:<index>" Last-Event-ID into (turn_id, index), or (None, 0).
+    """
+    if not event_id or ":" not in event_id:
+        return None, 0
+    turn_id, _, index = event_id.strip().rpartition(":")
+    try:
+        return turn_id, int(index)
+    except ValueError:
+        return None, 0